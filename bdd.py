@@ -0,0 +1,477 @@
+"""
+Binary Decision Diagrams
+
+This module defines reduced ordered binary decision diagrams (ROBDDs) for the
+expressions of boolean.py. Every boolean function has exactly one ROBDD for a
+given order of its symbols, so once expressions are converted two of them are
+equivalent if and only if they are the same node. Tautology checks and model
+counts also only depend on the size of the BDD instead of the 2^n rows of a
+truth table.
+
+All nodes belong to a BDD manager which stores them in a unique table and
+caches the results of the ITE (if then else) operation.
+
+The size of a BDD depends heavily on the order of its symbols. Sorting them by
+name, as truth_table does, is exponential for adders where the bits of each
+operand are named together. The manager can reorder its symbols by sifting,
+either when asked to or when the number of nodes grows past a threshold.
+"""
+import collections
+import time
+import weakref
+
+import boolean
+
+
+class Node:
+
+    """
+    A node of a BDD.
+
+    A node stands for the function "if var then high else low". The two
+    terminal nodes have no var and stand for TRUE and FALSE. Nodes are created
+    by a BDD manager and are never duplicated, so equal functions are the same
+    node.
+    """
+    __slots__ = ("var", "low", "high", "__weakref__")
+
+    def __init__(self, var, low, high):
+        self.var = var
+        self.low = low
+        self.high = high
+
+    def __repr__(self):
+        if self.var is None:
+            return "<Node(%s)>" % ("TRUE" if self.high else "FALSE")
+        return "<Node(%s, %s)>" % (repr(self.var), hex(id(self)))
+
+
+class BDD:
+
+    """
+    A manager for reduced ordered binary decision diagrams.
+
+    symbols gives the initial order of the variables, from the top of the
+    diagrams down. Symbols which aren't known are added to the bottom when
+    they are first used. Nodes which are no longer referenced are collected,
+    except for the results stored in the ITE cache, which holds at most
+    cache_size entries and drops the least recently used one when full.
+
+    If reorder_threshold is given, the symbols are sifted whenever the number
+    of nodes grows past it while converting an expression. Each reordering
+    stops after reorder_time_limit seconds, and the next one happens once the
+    number of nodes has doubled.
+    """
+
+    def __init__(self, symbols=(), cache_size=1 << 16, reorder_threshold=None,
+                 reorder_time_limit=None):
+        # The terminals are the only nodes without a var. The high child of a
+        # terminal is its value, which is only used for printing.
+        self.false = Node(None, None, False)
+        self.true = Node(None, None, True)
+        # Maps each var to its level and each level to its var. Terminals
+        # are below every var.
+        self._levels = {None: float("inf")}
+        self._vars = []
+        # One unique table per var which maps (low, high) to the node.
+        self._unique = {}
+        self._cache = collections.OrderedDict()
+        self.cache_size = cache_size
+        self.reorder_threshold = reorder_threshold
+        self.reorder_time_limit = reorder_time_limit
+        self._next_reorder = reorder_threshold
+        for symbol in symbols:
+            self.add_symbol(symbol)
+
+    def __len__(self):
+        """
+        Return the number of live nodes, not counting the terminals.
+        """
+        return sum(len(table) for table in self._unique.values())
+
+    @property
+    def symbols(self):
+        """
+        Return a tuple of the symbols in order.
+        """
+        return tuple(self._vars)
+
+    def level(self, node):
+        """
+        Return the level of the var of a node. Terminals are below every var.
+        """
+        return self._levels[node.var]
+
+    def add_symbol(self, symbol):
+        """
+        Add a symbol to the bottom of the order if it isn't known yet.
+        """
+        if not isinstance(symbol, boolean.Symbol):
+            raise TypeError("Argument must be Symbol but it is %s"
+                            % symbol.__class__)
+        if symbol not in self._levels:
+            self._levels[symbol] = len(self._vars)
+            self._vars.append(symbol)
+            self._unique[symbol] = weakref.WeakValueDictionary()
+
+    def node(self, var, low, high):
+        """
+        Return the node for "if var then high else low".
+
+        The diagram stays reduced: no node has equal children and no two
+        nodes are the same.
+        """
+        if low is high:
+            return low
+        table = self._unique[var]
+        key = (low, high)
+        node = table.get(key)
+        if node is None:
+            node = Node(var, low, high)
+            table[key] = node
+        return node
+
+    def var(self, symbol):
+        """
+        Return the node for a symbol.
+        """
+        self.add_symbol(symbol)
+        var = self._vars[self._levels[symbol]]
+        return self.node(var, self.false, self.true)
+
+    def _cofactors(self, node, var):
+        """
+        Return the low and high cofactors of a node with respect to a var.
+        """
+        if node.var is var:
+            return node.low, node.high
+        return node, node
+
+    def ite(self, f, g, h):
+        """
+        Return the node for "if f then g else h".
+
+        All other operations are built from this one. Results are stored in
+        the computed cache. The recursion on the cofactors uses an explicit
+        stack, so BDDs may have more levels than the recursion limit.
+        """
+        true = self.true
+        false = self.false
+        cache = self._cache
+        levels = self._levels
+        cofactors = self._cofactors
+        # Each frame is f, g, h and None until it has been split on a var,
+        # after which the results of its cofactors are on top of results.
+        stack = [(f, g, h, None)]
+        results = []
+        while stack:
+            f, g, h, var = stack.pop()
+            key = (f, g, h)
+            if var is not None:
+                high = results.pop()
+                result = self.node(var, results.pop(), high)
+                cache[key] = result
+                if len(cache) > self.cache_size:
+                    cache.popitem(last=False)
+                results.append(result)
+                continue
+            # Terminal cases
+            if f is true:
+                results.append(g)
+            elif f is false:
+                results.append(h)
+            elif g is h:
+                results.append(g)
+            elif g is true and h is false:
+                results.append(f)
+            else:
+                result = cache.get(key)
+                if result is not None:
+                    cache.move_to_end(key)
+                    results.append(result)
+                    continue
+                # Split on the top var
+                var = min((f.var, g.var, h.var), key=levels.__getitem__)
+                f0, f1 = cofactors(f, var)
+                g0, g1 = cofactors(g, var)
+                h0, h1 = cofactors(h, var)
+                stack.append((f, g, h, var))
+                stack.append((f1, g1, h1, None))
+                stack.append((f0, g0, h0, None))
+        return results[0]
+
+    def apply_not(self, f):
+        return self.ite(f, self.false, self.true)
+
+    # The deepest operands are combined first, so that for example an AND of
+    # many symbols adds one node per symbol instead of going through
+    # everything built so far each time.
+
+    def apply_and(self, *fs):
+        result = self.true
+        for f in sorted(fs, key=self.level, reverse=True):
+            result = self.ite(f, result, self.false)
+        return result
+
+    def apply_or(self, *fs):
+        result = self.false
+        for f in sorted(fs, key=self.level, reverse=True):
+            result = self.ite(f, self.true, result)
+        return result
+
+    def clear_cache(self):
+        """
+        Empty the computed cache, allowing the nodes in it to be collected.
+        """
+        self._cache.clear()
+
+    def swap(self, level):
+        """
+        Swap the symbols at a level and the level below it.
+
+        Only the nodes of the upper symbol which depend on the lower one are
+        rebuilt. They are changed in place, so every node still stands for the
+        same function and existing references and cache entries stay valid.
+        """
+        x = self._vars[level]
+        y = self._vars[level + 1]
+        table_x = self._unique[x]
+        table_y = self._unique[y]
+        moved = [node for node in list(table_x.values())
+                 if node.low.var is y or node.high.var is y]
+        for node in moved:
+            del table_x[(node.low, node.high)]
+        self._vars[level], self._vars[level + 1] = y, x
+        self._levels[x], self._levels[y] = level + 1, level
+        for node in moved:
+            f00, f01 = self._cofactors(node.low, y)
+            f10, f11 = self._cofactors(node.high, y)
+            node.var = y
+            node.low = self.node(x, f00, f10)
+            node.high = self.node(x, f01, f11)
+            table_y[(node.low, node.high)] = node
+
+    def reorder(self, time_limit=None, max_growth=1.2):
+        """
+        Reorder the symbols to reduce the number of nodes by sifting.
+
+        Each symbol in turn, starting with those with the most nodes, is moved
+        through every level and left where there were the fewest nodes. A
+        symbol stops moving in one direction once the number of nodes is over
+        max_growth times the best so far. No more symbols are sifted after
+        time_limit seconds. The computed cache is emptied first so that it
+        doesn't keep dead nodes alive. Returns the number of nodes.
+        """
+        self.clear_cache()
+        deadline = None
+        if time_limit is not None:
+            deadline = time.monotonic() + time_limit
+        unique = self._unique
+        for var in sorted(self._vars, key=lambda v: len(unique[v]),
+                          reverse=True):
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            self._sift(var, max_growth, deadline)
+        return len(self)
+
+    def _sift(self, var, max_growth, deadline):
+        """
+        Move a symbol to the level where there are the fewest nodes.
+
+        The symbol goes to the nearer end of the order first, then to the
+        other end, then back to the best level seen.
+        """
+        last = len(self._vars) - 1
+        best_size = len(self)
+        best_level = self._levels[var]
+        if best_level > last - best_level:
+            ends = (last, 0)
+        else:
+            ends = (0, last)
+        for end in ends:
+            step = 1 if end > self._levels[var] else -1
+            while self._levels[var] != end:
+                level = self._levels[var]
+                self.swap(level if step == 1 else level - 1)
+                size = len(self)
+                if size < best_size:
+                    best_size = size
+                    best_level = self._levels[var]
+                elif size > max_growth * best_size:
+                    break
+            if deadline is not None and time.monotonic() > deadline:
+                break
+        while self._levels[var] < best_level:
+            self.swap(self._levels[var])
+        while self._levels[var] > best_level:
+            self.swap(self._levels[var] - 1)
+
+    def from_expression(self, expr):
+        """
+        Return the node for an expression, which may be a string or Expression.
+
+        Unknown symbols are added to the bottom of the order sorted by name.
+        """
+        if isinstance(expr, str):
+            expr = boolean.parse(expr, eval=False)
+        if not isinstance(expr, boolean.Expression):
+            raise TypeError("Argument must be str or Expression but it is %s"
+                            % expr.__class__)
+        for symbol in sorted(expr.symbols, key=lambda s: str(s)):
+            self.add_symbol(symbol)
+
+        ops = expr.algebra.operations
+        nodes = {}
+        stack = [(expr, False)]
+        while stack:
+            e, visited = stack.pop()
+            if e in nodes:
+                continue
+            if isinstance(e, boolean.BaseElement):
+                nodes[e] = self.true if e else self.false
+            elif isinstance(e, boolean.Symbol):
+                nodes[e] = self.var(e)
+            elif not visited:
+                stack.append((e, True))
+                stack.extend((arg, False) for arg in e.args)
+            elif isinstance(e, ops.NOT):
+                nodes[e] = self.apply_not(nodes[e.args[0]])
+            elif isinstance(e, ops.AND):
+                nodes[e] = self.apply_and(*(nodes[arg] for arg in e.args))
+            elif isinstance(e, ops.OR):
+                nodes[e] = self.apply_or(*(nodes[arg] for arg in e.args))
+            else:
+                raise TypeError("Can't convert %s." % e.__class__.__name__)
+            if self._next_reorder is not None and \
+                    len(self) > self._next_reorder:
+                self.reorder(self.reorder_time_limit)
+                self._next_reorder = max(self.reorder_threshold, 2 * len(self))
+        return nodes[expr]
+
+    def to_expression(self, f):
+        """
+        Return an expression for a node.
+
+        The expression is a sum of products following the paths to the TRUE
+        terminal, with shared nodes giving shared subexpressions.
+        """
+        ops = boolean.ALGEBRA.operations
+        expressions = {self.false: boolean.FALSE, self.true: boolean.TRUE}
+        stack = [f]
+        while stack:
+            node = stack[-1]
+            if node in expressions:
+                stack.pop()
+                continue
+            if node.low not in expressions or node.high not in expressions:
+                stack.append(node.low)
+                stack.append(node.high)
+                continue
+            stack.pop()
+            low = expressions[node.low]
+            high = expressions[node.high]
+            var = node.var
+            terms = []
+            for literal, child in ((var, high), (ops.NOT(var), low)):
+                if child is boolean.TRUE:
+                    terms.append(literal)
+                elif child is not boolean.FALSE:
+                    terms.append(ops.AND(literal, child, eval=False))
+            if len(terms) == 1:
+                expressions[node] = terms[0]
+            else:
+                expressions[node] = ops.OR(*terms, eval=False)
+        return expressions[f]
+
+    def nodes(self, f):
+        """
+        Return a set of the nodes reachable from a node, including terminals.
+        """
+        seen = set()
+        stack = [f]
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            if node.var is not None:
+                stack.append(node.low)
+                stack.append(node.high)
+        return seen
+
+    def size(self, f):
+        """
+        Return the number of nodes reachable from a node, including terminals.
+        """
+        return len(self.nodes(f))
+
+    def count(self, f):
+        """
+        Return the number of assignments of all symbols in the manager for
+        which a node is TRUE.
+        """
+        length = len(self._vars)
+        levels = self._levels
+
+        def level(node):
+            return length if node.var is None else levels[node.var]
+
+        counts = {self.false: 0, self.true: 1}
+        stack = [f]
+        while stack:
+            node = stack[-1]
+            if node in counts:
+                stack.pop()
+                continue
+            if node.low not in counts or node.high not in counts:
+                stack.append(node.low)
+                stack.append(node.high)
+                continue
+            stack.pop()
+            below = level(node) + 1
+            counts[node] = (counts[node.low] << (level(node.low) - below)) +\
+                (counts[node.high] << (level(node.high) - below))
+        return counts[f] << level(f)
+
+    def satisfy(self, f):
+        """
+        Return a dictionary mapping symbols to TRUE or FALSE for which a node
+        is TRUE, or None if there is none. Symbols which don't matter are left
+        out.
+        """
+        if f is self.false:
+            return None
+        assignment = {}
+        while f.var is not None:
+            if f.low is self.false:
+                assignment[f.var] = boolean.TRUE
+                f = f.high
+            else:
+                assignment[f.var] = boolean.FALSE
+                f = f.low
+        return assignment
+
+
+def equivalent(expr1, expr2):
+    """
+    Return True if two expressions are equal for every assignment.
+    """
+    manager = BDD()
+    return manager.from_expression(expr1) is manager.from_expression(expr2)
+
+
+def is_tautology(expr):
+    """
+    Return True if an expression is TRUE for every assignment.
+    """
+    manager = BDD()
+    return manager.from_expression(expr) is manager.true
+
+
+def count(expr):
+    """
+    Return the number of assignments of the symbols of an expression for which
+    it is TRUE.
+    """
+    manager = BDD()
+    return manager.count(manager.from_expression(expr))
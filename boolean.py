@@ -19,6 +19,9 @@ Copyright (c) 2015 Qi-rui Chen, Qi-rui.Chen@hotmail.co.uk
 """
 import itertools
 import collections
+import heapq
+import time
+import weakref
 
 # A boolean algebra is defined by its base elements (=domain), its operations
 # (in this case only NOT, AND and OR) and an additional "symbol" type.
@@ -33,6 +36,50 @@ BooleanDomain = collections.namedtuple("BooleanDomain",
 BooleanOperations = collections.namedtuple("BooleanOperations",
                                            ("NOT", "AND", "OR"))
 
+# Unique table used to hash-cons expressions. Maps a structural key to the
+# single live expression with that structure. Values are weak so expressions
+# that are no longer used can still be collected.
+_unique_table = weakref.WeakValueDictionary()
+# Stores if new expressions are hash-consed, see set_interning.
+_interning = False
+
+
+def set_interning(enabled=True):
+    """
+    Enable or disable hash-consing (interning) of expressions.
+
+    While enabled, new functions and Symbols named by a str, int or tuple are
+    looked up in a unique table so structurally equal expressions are the same
+    object. Two interned expressions are then equal if and only if they are
+    identical. As equality ignores the order of arguments, an interned
+    function keeps the argument order it was first created with.
+
+    Expressions created while interning is disabled are not affected and still
+    compare structurally with interned ones.
+
+    Returns the previous setting.
+    """
+    global _interning
+    previous = _interning
+    _interning = bool(enabled)
+    return previous
+
+
+def _intern(key, expr):
+    """
+    Return the interned expression for key, storing expr if there is none.
+
+    Keys that can't be hashed (e.g. Symbols holding a list) are not interned.
+    """
+    try:
+        interned = _unique_table.get(key)
+    except TypeError:
+        return expr
+    if interned is None:
+        expr._interned = True
+        _unique_table[key] = interned = expr
+    return interned
+
 
 class Expression(object):
 
@@ -49,6 +96,14 @@ class Expression(object):
     _hash = None
     # Stores an object associated to this boolean expression.
     _obj = None
+    # Stores if an expression is the only one with its structure.
+    _interned = False
+    # Caches functions created by compile. (Expressions are immutable)
+    _compiled = None
+    # Cache the frozensets of symbols, literals and objects.
+    _symbols = None
+    _literals = None
+    _objects = None
 
     # Holds an Algebra tuple which defines the boolean algebra.
     algebra = None
@@ -80,18 +135,46 @@ class Expression(object):
         """
         return self._obj
 
+    def _collect(self, attr, key):
+        """
+        Return a frozenset of key(e) for all subexpressions e where it isn't
+        None, caching it in attr.
+
+        Subexpressions with a key aren't looked inside. The expression is
+        walked without recursion and shared subterms are only visited once.
+        """
+        result = getattr(self, attr)
+        if result is not None:
+            return result
+        found = set()
+        seen = {id(self)}
+        stack = [self]
+        while stack:
+            expr = stack.pop()
+            cached = getattr(expr, attr)
+            if cached is not None:
+                found.update(cached)
+                continue
+            k = key(expr)
+            if k is not None:
+                found.add(k)
+            elif expr.args:
+                for arg in expr.args:
+                    if id(arg) not in seen:
+                        seen.add(id(arg))
+                        stack.append(arg)
+        result = frozenset(found)
+        setattr(self, attr, result)
+        return result
+
     @property
     def objects(self):
         """
-        Return a set off all associated objects in this expression.
+        Return a frozenset off all associated objects in this expression.
 
         Might be an empty set.
         """
-        s = set() if self.obj is None else set([self.obj])
-        if self.args is not None:
-            for arg in self.args:
-                s |= arg.objects
-        return s
+        return self._collect("_objects", lambda e: e.obj)
 
     @property
     def isliteral(self):
@@ -103,17 +186,11 @@ class Expression(object):
     @property
     def literals(self):
         """
-        Return a set of all literals contained in this or any subexpression.
+        Return a frozenset of all literals contained in this or any
+        subexpression.
         """
-        if self.isliteral:
-            return set((self,))
-        if self.args is None:
-            return set()
-        else:
-            s = set()
-            for arg in self.args:
-                s |= arg.literals
-            return s
+        return self._collect("_literals",
+                             lambda e: e if e.isliteral else None)
 
     def literalize(self):
         """
@@ -130,51 +207,59 @@ class Expression(object):
     @property
     def symbols(self):
         """
-        Return a set of all symbols contained in this or any subexpression.
+        Return a frozenset of all symbols contained in this or any
+        subexpression.
         """
-        if isinstance(self, Symbol):
-            return set((self,))
-        if self.args is None:
-            return set()
-        else:
-            s = set()
-            for arg in self.args:
-                s |= arg.symbols
-            return s
+        return self._collect("_symbols",
+                             lambda e: e if isinstance(e, Symbol) else None)
 
     def subs(self, subs_dict, *, eval=True):
         """
         Return an expression where all subterms equal to a key are substituted.
+
+        Subterms are looked up in subs_dict by their hash, and a subterm
+        shared by several parts of the expression is only substituted once.
         """
-        for expr, substitution in subs_dict.items():
-            if expr == self:
-                return substitution
+        if self in subs_dict:
+            return subs_dict[self]
         expr = self._subs(subs_dict, eval=eval)
         return self if expr is None else expr
 
     def _subs(self, subs_dict, eval):
-        new_args = []
-        changed_something = False
-        for arg in self.args:
-            matched = False
-            for expr, substitution in subs_dict.items():
-                if arg == expr:
-                    new_args.append(substitution)
-                    changed_something = matched = True
-                    break
-            if not matched:
-                new_arg = None if arg.args is None else\
-                    arg._subs(subs_dict, eval)
-                if new_arg is None:
-                    new_args.append(arg)
-                else:
-                    changed_something = True
-                    new_args.append(new_arg)
-
-        if changed_something:
-            return self.__class__(*new_args, eval=eval)
-        else:
+        if self.args is None or not subs_dict:
             return None
+        # Maps the id of each subterm to its substitution, or None if it
+        # stays the same. The subterms are all kept alive by self.
+        done = {}
+        stack = [self]
+        while stack:
+            expr = stack[-1]
+            if id(expr) in done:
+                stack.pop()
+                continue
+            new_args = []
+            pending = False
+            for arg in expr.args:
+                if arg in subs_dict:
+                    new_args.append(subs_dict[arg])
+                elif arg.args is None:
+                    new_args.append(None)
+                elif id(arg) in done:
+                    new_args.append(done[id(arg)])
+                else:
+                    stack.append(arg)
+                    pending = True
+            if pending:
+                continue
+            stack.pop()
+            if any(arg is not None for arg in new_args):
+                done[id(expr)] = expr.__class__(
+                    *(arg if new is None else new
+                      for arg, new in zip(expr.args, new_args)),
+                    eval=eval)
+            else:
+                done[id(expr)] = None
+        return done[id(self)]
 
     @property
     def iscanonical(self):
@@ -189,6 +274,54 @@ class Expression(object):
         """
         return self
 
+    def compile(self, symbols=None, bitmask=False):
+        """
+        Return a function which evaluates the expression to True or False.
+
+        The function takes the values of the given symbols as a sequence in
+        the same order. If bitmask is True it instead takes an int where the
+        first symbol is the most significant bit, so row i of a truth table is
+        evaluated by passing i. By default the symbols are sorted by name, as
+        they are in truth_table.
+
+        AND and OR are short-circuited. Compiled functions are cached on the
+        expression.
+        """
+        if symbols is None:
+            symbols = sorted(self.symbols, key=lambda s: str(s))
+        key = (tuple(symbols), bool(bitmask))
+        if self._compiled is None:
+            self._compiled = {}
+        elif key in self._compiled:
+            return self._compiled[key]
+        length = len(key[0])
+        if bitmask:
+            names = {s: "(v>>%s&1)" % (length - i - 1)
+                     for i, s in enumerate(key[0])}
+        else:
+            names = {s: "v[%s]" % i for i, s in enumerate(key[0])}
+        missing = self.symbols.difference(names)
+        if missing:
+            raise ValueError("Symbols %s are not given."
+                             % ", ".join(str(s) for s in missing))
+        try:
+            source = "lambda v: bool(%s)" % _python_expression(self, names)
+            function = eval(source, {})
+        except (RecursionError, SyntaxError, MemoryError):
+            # Too deeply nested for the parser, evaluate one subterm per line
+            # instead. This loses short-circuiting but shares subterms.
+            namespace = {}
+            exec(_python_function(self, names), namespace)
+            function = namespace["f"]
+        self._compiled[key] = function
+        return function
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Compiled functions cannot be pickled
+        state.pop("_compiled", None)
+        return state
+
     def __hash__(self):
         """
         Calculate a hash respecting the structure of the whole expression.
@@ -203,16 +336,25 @@ class Expression(object):
         # hash of the subterms (stored in args). If the object has no subterms,
         # the id of the object is used instead.
         # Since all boolean objects are immutable the hash only has to be
-        # computed once.
+        # computed once. Subterms are hashed first, deepest first, so that
+        # deep expressions don't reach the recursion limit.
         if self._hash is None:
-            if self.args is None:
-                arghash = id(self)
-            else:
-                arghash = hash(frozenset(self.args))
-            self._hash = hash(self.__class__.__name__) ^ arghash
-            return self._hash
-        else:
-            return self._hash
+            stack = [self]
+            while stack:
+                expr = stack[-1]
+                pending = [arg for arg in expr.args or ()
+                           if arg._hash is None and arg.args is not None]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+                if expr._hash is None:
+                    if expr.args is None:
+                        arghash = id(expr)
+                    else:
+                        arghash = hash(frozenset(expr.args))
+                    expr._hash = hash(expr.__class__.__name__) ^ arghash
+        return self._hash
 
     def __eq__(self, other):
         """
@@ -228,6 +370,9 @@ class Expression(object):
             return True
         if not isinstance(other, self.__class__):
             return NotImplemented
+        if self._interned and other._interned and\
+                type(self) is type(other):
+            return False
         if self.args is None or other.args is None:
             return False
         if frozenset(self.args) == frozenset(other.args):
@@ -385,10 +530,23 @@ class Symbol(Expression):
     _obj = None
 
     def __new__(cls, obj=None, *, eval=False):
-        return object.__new__(cls)
+        self = object.__new__(cls)
+        self._obj = obj
+        if _interning:
+            if obj is None:
+                # Anonymous symbols are already unique.
+                self._interned = True
+            elif isinstance(obj, (str, int, tuple, frozenset)):
+                # Other objects (e.g. BooleanAlgebra instances) may not be
+                # hashable until they are fully initialised.
+                return _intern((cls, obj), self)
+        return self
 
     def __init__(self, obj=None, *, eval=False):
-        self._obj = obj
+        # Interned symbols are shared, so keep the object they were created
+        # with (e.g. Symbol(1) and Symbol(True) are the same symbol).
+        if not self._interned:
+            self._obj = obj
 
     @property
     def obj(self):
@@ -426,6 +584,9 @@ class Symbol(Expression):
             return True
         if not isinstance(other, self.__class__):
             return NotImplemented
+        if self._interned and other._interned and\
+                type(self) is type(other):
+            return False
         if self.obj is None or other.obj is None:
             return False
         else:
@@ -489,17 +650,31 @@ class Function(Expression):
         if order[1] < length:
             raise TypeError("Too many arguments. Got %s, but need at most %s."
                             % (length, order[1]))
-        return object.__new__(cls)
+        self = object.__new__(cls)
+        if _interning:
+            self._args = cls._convert_args(args)
+            try:
+                key = (cls, frozenset(self._args))
+            except TypeError:
+                return self
+            return _intern(key, self)
+        return self
 
     def __init__(self, *args, eval=True):
         # If a function in the __new__ method is evaluated the __init__ method
         # will be called twice. First with the simplified then with original
         # arguments. The following "if" prevents that the simplified ones are
-        # overwritten.
+        # overwritten. This also keeps interned functions unchanged.
         if self._args:
             return
+        self._args = self._convert_args(args)
+
+    @staticmethod
+    def _convert_args(args):
+        """
+        Return a tuple of args where all arguments are boolean expressions.
+        """
         _args = [None] * len(args)
-        # Make sure all arguments are boolean expressions.
         for i, arg in enumerate(args):
             if isinstance(arg, Expression):
                 _args[i] = arg
@@ -511,7 +686,7 @@ class Function(Expression):
                 _args[i] = TRUE
             else:
                 raise TypeError("Bad argument: %s" % arg)
-        self._args = tuple(_args)
+        return tuple(_args)
 
     def __str__(self):
         args = self.args
@@ -756,10 +931,7 @@ class DualBase(Function):
         if self.annihilator in term.args:
             return self.annihilator
         # Idempotence: A * A = A, A + A = A
-        args = []
-        for arg in term.args:
-            if arg not in args:
-                args.append(arg)
+        args = list(dict.fromkeys(term.args))
         if len(args) == 1:
             return args[0]
         # Identity: A * 1 = A, A + 0 = A
@@ -768,55 +940,48 @@ class DualBase(Function):
             if len(args) == 1:
                 return args[0]
         # Complementation: A * ~A = 0, A + ~A = 1
+        argset = set(args)
         for arg in args:
-            if ops.NOT(arg) in args:
+            if ops.NOT(arg) in argset:
                 return self.annihilator
         # Elimination: (A * B) + (A * ~B) = A, (A + B) * (A + ~B) = A
+        # Terms are indexed by their args with one left out together with the
+        # arg left out, so a term's partner is found by looking up each of
+        # its args negated. Combined terms are appended to be combined again.
+        dual = self.dual
+        others = {}
+        eliminated = False
         i = 0
-        while i < len(args) - 1:
-            j = i + 1
+        while i < len(args):
             ai = args[i]
-            if not isinstance(ai, self.dual):
-                i += 1
+            i += 1
+            if not isinstance(ai, dual) or len(ai.args) < 2:
                 continue
-            while j < len(args):
-                aj = args[j]
-                if not isinstance(aj, self.dual) or \
-                        len(ai.args) != len(aj.args):
-                    j += 1
-                    continue
-                # Find terms where only one arg is different.
-                negated = None
-                for arg in ai.args:
-                    if arg in aj.args:
-                        pass
-                    elif ops.NOT(arg, eval=False).cancel() in aj.args:
-                        if negated is None:
-                            negated = arg
-                        else:
-                            negated = None
-                            break
-                    else:
-                        negated = None
-                        break
-                # If the different arg is a negation simplify the term.
-                if negated is not None:
-                    # Cancel out one of the two terms.
-                    del args[j]
-                    aiargs = list(ai.args)
-                    aiargs.remove(negated)
-                    if len(aiargs) == 1:
-                        args[i] = aiargs[0]
-                    else:
-                        args[i] = self.dual(*aiargs, eval=False)
-                    if len(args) == 1:
-                        return args[0]
+            aiargs = frozenset(ai.args)
+            keys = []
+            for arg in ai.args:
+                rest = aiargs.difference((arg,))
+                j = others.get((rest, ops.NOT(arg, eval=False).cancel()))
+                if j is not None and args[j] is not None:
+                    args[i - 1] = args[j] = None
+                    if len(rest) == 1:
+                        args.extend(rest)
                     else:
-                        # Now the other simplifications have to be
-                        # redone.
-                        return self.__class__(*args, eval=True)
-                j += 1
-            i += 1
+                        args.append(dual(*(a for a in ai.args if a in rest),
+                                         eval=False))
+                    eliminated = True
+                    break
+                keys.append((rest, arg))
+            else:
+                for key in keys:
+                    others[key] = i - 1
+        if eliminated:
+            args = [arg for arg in args if arg is not None]
+            if len(args) == 1:
+                return args[0]
+            else:
+                # Now the other simplifications have to be redone.
+                return self.__class__(*args, eval=True)
         # Absorption: A * (A + B) = A, A + (A * B) = A
         # Negative absorption: A * (~A + B) = A * B, A + (~A * B) = A + B
         args = self.absorb(args)
@@ -850,38 +1015,69 @@ class DualBase(Function):
         # Negative absorption: A * (~A + B) = A * B, A + (~A * B) = A + B
         args = list(self.args) if useargs is None else list(useargs)
         ops = self.algebra.operations
-        i = 0
-        while i < len(args):
+        dual = self.dual
+        # Maps each arg of the dual terms to the positions of those terms, so
+        # only the terms an absorber can change are looked at. Removed terms
+        # are left as None until the end so positions don't move.
+        index = {}
+
+        def add(j):
+            if isinstance(args[j], dual):
+                for arg in args[j].args:
+                    index.setdefault(arg, set()).add(j)
+
+        def discard(j):
+            if isinstance(args[j], dual):
+                for arg in args[j].args:
+                    index[arg].discard(j)
+
+        def common(exprs):
+            """
+            Returns the positions of the terms containing all of exprs.
+            """
+            sets = sorted((index.get(expr, ()) for expr in exprs), key=len)
+            return set(sets[0]).intersection(*sets[1:]) if sets else set()
+
+        def containing(expr):
+            """
+            Returns the positions of the terms that expr is in.
+            """
+            found = set(index.get(expr, ()))
+            if isinstance(expr, dual):
+                found |= common(expr.args)
+            return found
+
+        for j in range(len(args)):
+            add(j)
+        for i in range(len(args)):
             absorber = args[i]
-            j = 0
-            while j < len(args):
-                if j == i:
-                    j += 1
-                    continue
+            if absorber is None:
+                continue
+            neg_absorber = ops.NOT(absorber, eval=False).cancel()
+            targets = containing(absorber) | containing(neg_absorber)
+            if isinstance(absorber, dual):
+                for arg in absorber.args:
+                    narg = ops.NOT(arg, eval=False).cancel()
+                    targets |= common([narg] + [a for a in absorber.args
+                                                if a is not arg])
+            targets.discard(i)
+            for j in sorted(targets):
                 target = args[j]
-                if not isinstance(target, self.dual):
-                    j += 1
+                if not isinstance(target, dual):
                     continue
                 # Absorption
                 if absorber in target:
-                    del args[j]
-                    if j < i:
-                        i -= 1
+                    discard(j)
+                    args[j] = None
                     continue
                 # Negative absorption
-                neg_absorber = ops.NOT(absorber, eval=False).cancel()
                 if neg_absorber in target:
-                    b = target.remove(neg_absorber, eval=False)
-                    if b is None:
-                        del args[j]
-                        if j < i:
-                            i -= 1
-                        continue
-                    else:
-                        args[j] = b
-                        j += 1
-                        continue
-                if isinstance(absorber, self.dual):
+                    discard(j)
+                    args[j] = target.remove(neg_absorber, eval=False)
+                    if args[j] is not None:
+                        add(j)
+                    continue
+                if isinstance(absorber, dual):
                     remove = None
                     for arg in absorber.args:
                         narg = ops.NOT(arg, eval=False).cancel()
@@ -897,9 +1093,11 @@ class DualBase(Function):
                             remove = None
                             break
                     if remove is not None:
+                        discard(j)
                         args[j] = target.remove(remove)
-                j += 1
-            i += 1
+                        if args[j] is not None:
+                            add(j)
+        args = [arg for arg in args if arg is not None]
         if useargs:
             return args
         if len(args) == 1:
@@ -989,6 +1187,66 @@ class OR(DualBase):
     operator = "+"
 
 
+def _python_expression(expr, names):
+    """
+    Return a python expression evaluating expr.
+
+    names maps symbols to python expressions giving their values.
+    """
+    if isinstance(expr, BaseElement):
+        return "True" if expr else "False"
+    if isinstance(expr, Symbol):
+        return names[expr]
+    ops = expr.algebra.operations
+    if isinstance(expr, ops.NOT):
+        return "(not %s)" % _python_expression(expr.args[0], names)
+    if isinstance(expr, ops.AND):
+        operator = " and "
+    elif isinstance(expr, ops.OR):
+        operator = " or "
+    else:
+        raise TypeError("Can't compile %s." % expr.__class__.__name__)
+    return "(%s)" % operator.join(_python_expression(arg, names)
+                                  for arg in expr.args)
+
+
+def _python_function(expr, names):
+    """
+    Return the source of a function f evaluating expr one subterm per line.
+
+    Unlike _python_expression this doesn't recurse, so it works for
+    expressions of any depth.
+    """
+    ops = expr.algebra.operations
+    lines = ["def f(v):"]
+    variables = {}
+    stack = [(expr, False)]
+    while stack:
+        e, visited = stack.pop()
+        if e in variables:
+            continue
+        if isinstance(e, BaseElement):
+            value = "True" if e else "False"
+        elif isinstance(e, Symbol):
+            value = names[e]
+        elif not visited:
+            stack.append((e, True))
+            stack.extend((arg, False) for arg in e.args)
+            continue
+        elif isinstance(e, ops.NOT):
+            value = "not " + variables[e.args[0]]
+        elif isinstance(e, ops.AND):
+            value = " and ".join(variables[arg] for arg in e.args)
+        elif isinstance(e, ops.OR):
+            value = " or ".join(variables[arg] for arg in e.args)
+        else:
+            raise TypeError("Can't compile %s." % e.__class__.__name__)
+        variables[e] = "t%s" % len(variables)
+        lines.append("    %s = %s" % (variables[e], value))
+    lines.append("    return bool(%s)" % variables[expr])
+    return "\n".join(lines)
+
+
 # Create a default algebra.
 DOMAIN = BooleanDomain(TRUE=TRUE, FALSE=FALSE)
 OPERATIONS = BooleanOperations(NOT=NOT, AND=AND, OR=OR)
@@ -1033,6 +1291,524 @@ def normalize(operation, expr):
     return args
 
 
+def minimize(expr, method="qm", iterations=10):
+    """
+    Return a minimal sum of products equal to expr.
+
+    The following methods are supported:
+     - "qm": Quine-McCluskey. Finds every prime implicant and then the
+       smallest set of them covering the expression, fewest literals first.
+       The result is exact but the cost grows exponentially with the number
+       of symbols, so it is only practical up to about 10 symbols. The
+       search for the smallest cover is limited to QM_SEARCH_NODES branches
+       and QM_TIME_LIMIT seconds, so for large unstructured expressions the
+       result may not be minimal.
+     - "espresso": Heuristic minimisation in the style of Espresso-II. A list
+       of cubes is improved by repeating the REDUCE, EXPAND and IRREDUNDANT
+       steps until it stops getting smaller or iterations is reached. The
+       result is irredundant and made of prime implicants but not always
+       minimal. No truth table is built, so it works for wide expressions.
+    """
+    if isinstance(expr, str):
+        expr = parse(expr, eval=False)
+    if not isinstance(expr, Expression):
+        raise TypeError(
+            "Argument must be str or Expression but it is %s" % expr.__class__)
+    symbols = sorted(expr.symbols, key=lambda e: str(e))
+    if method == "qm":
+        symbols, columns = truth_table_columns(expr, symbols)
+        cubes = _qm_cover(columns[expr], len(symbols))
+    elif method == "espresso":
+        cubes = _espresso(expr, symbols, iterations)
+    else:
+        raise ValueError("Unknown method %s." % method)
+    return _sum_of_products(cubes, symbols, expr.algebra)
+
+
+def _sum_of_products(cubes, symbols, algebra):
+    """
+    Return an expression from a list of cubes.
+
+    A cube is a tuple (value, dont_care) of ints, where bit i is the symbol
+    len(symbols) - i - 1 so that a cube with no don't cares is a row of the
+    truth table. A symbol is TRUE in the cube if its bit is set in value and
+    is ignored if its bit is set in dont_care. The expression is built in the
+    given algebra.
+    """
+    ops = algebra.operations
+    length = len(symbols)
+    terms = []
+    for value, dont_care in cubes:
+        literals = []
+        for i, symbol in enumerate(symbols):
+            bit = 1 << (length - i - 1)
+            if not dont_care & bit:
+                literals.append(symbol if value & bit else ops.NOT(symbol))
+        if not literals:
+            return algebra.domain.TRUE
+        elif len(literals) == 1:
+            terms.append(literals[0])
+        else:
+            terms.append(ops.AND(*literals))
+    if not terms:
+        return algebra.domain.FALSE
+    elif len(terms) == 1:
+        return terms[0]
+    return ops.OR(*terms)
+
+
+def _prime_implicants(rows, length):
+    """
+    Return the prime implicants of a truth table column as a set of cubes.
+
+    This is the first step of Quine-McCluskey. Cubes are merged if they
+    differ in exactly one bit, which is found by looking up the cube with
+    that bit set instead of comparing every pair of cubes.
+    """
+    cubes = set((row, 0) for row in range(1 << length) if rows >> row & 1)
+    primes = set()
+    while cubes:
+        merged = set()
+        used = set()
+        for value, dont_care in cubes:
+            for i in range(length):
+                bit = 1 << i
+                if dont_care & bit or value & bit:
+                    continue
+                other = (value | bit, dont_care)
+                if other in cubes:
+                    merged.add((value, dont_care | bit))
+                    used.add((value, dont_care))
+                    used.add(other)
+        primes |= cubes - used
+        cubes = merged
+    return primes
+
+
+# The most branches and seconds _qm_cover searches for before settling for the
+# best cover it has found. Random truth tables with 9 or more symbols can take
+# hours to search exhaustively.
+QM_SEARCH_NODES = 2000
+QM_TIME_LIMIT = 1.0
+
+
+def _cube_rows(cube, masks, full):
+    """
+    Return the rows of the truth table covered by a cube as an int.
+    """
+    value, dont_care = cube
+    length = len(masks)
+    rows = full
+    for i, mask in enumerate(masks):
+        bit = 1 << (length - i - 1)
+        if not dont_care & bit:
+            rows &= mask if value & bit else full ^ mask
+    return rows
+
+
+def _qm_cover(rows, length, max_nodes=None, time_limit=None):
+    """
+    Return the smallest list of prime implicants covering the given rows.
+
+    Essential prime implicants are taken and dominated ones dropped until
+    neither rule applies, after which the remaining choices are searched
+    with branch and bound. The search starts from a greedy cover and gives
+    up after max_nodes branches (QM_SEARCH_NODES by default) or time_limit
+    seconds (QM_TIME_LIMIT by default), returning the best cover found so
+    far.
+    """
+    if max_nodes is None:
+        max_nodes = QM_SEARCH_NODES
+    if time_limit is None:
+        time_limit = QM_TIME_LIMIT
+    full = (1 << (1 << length)) - 1
+    masks = _symbol_masks(length)
+    primes = sorted(_prime_implicants(rows, length),
+                    key=lambda c: -bin(c[1]).count("1"))
+    # Fewer literals is better, so the cost of a cube is its literal count
+    covers = {p: _cube_rows(p, masks, full) for p in primes}
+    costs = {p: length - bin(p[1]).count("1") for p in primes}
+
+    def reduce(remaining, candidates, chosen):
+        """
+        Apply the essential and dominance rules.
+        """
+        while True:
+            candidates = [c for c in candidates if covers[c] & remaining]
+            changed = False
+            # Essential: A row covered by only one candidate
+            row_candidates = {}
+            for c in candidates:
+                cover = covers[c] & remaining
+                while cover:
+                    low = cover & -cover
+                    row_candidates.setdefault(low, []).append(c)
+                    cover ^= low
+            for row, cs in row_candidates.items():
+                if len(cs) == 1 and remaining & row:
+                    chosen = chosen + [cs[0]]
+                    remaining &= ~covers[cs[0]]
+                    changed = True
+            if changed:
+                continue
+            # Dominance: Drop candidates covering a subset of a cheaper one,
+            # which must cover the first of their rows
+            kept = []
+            for c in candidates:
+                cover = covers[c] & remaining
+                if not any(d != c and costs[d] <= costs[c] and
+                           cover & ~covers[d] == 0 and
+                           (covers[d] & remaining != cover or
+                            (costs[d], d) < (costs[c], c))
+                           for d in row_candidates[cover & -cover]):
+                    kept.append(c)
+            if len(kept) == len(candidates):
+                return remaining, candidates, chosen, row_candidates
+            candidates = kept
+
+    def cost(chosen):
+        return (len(chosen), sum(costs[c] for c in chosen))
+
+    # Start from a greedy cover so there is always an answer to fall back on
+    remaining, candidates, chosen, row_candidates = reduce(rows, primes, [])
+    # The rows a candidate adds only shrink as others are chosen, so a
+    # candidate whose count is still largest after updating it is the best
+    greedy = list(chosen)
+    left = remaining
+    heap = [(-bin(covers[c] & left).count("1"), costs[c], c)
+            for c in candidates]
+    heapq.heapify(heap)
+    while left:
+        count, c_cost, c = heapq.heappop(heap)
+        new_count = -bin(covers[c] & left).count("1")
+        if heap and (new_count, c_cost, c) > heap[0]:
+            heapq.heappush(heap, (new_count, c_cost, c))
+            continue
+        greedy.append(c)
+        left &= ~covers[c]
+    best = [greedy]
+    nodes = [max_nodes]
+    deadline = time.monotonic() + time_limit
+
+    def search(remaining, candidates, chosen, row_candidates):
+        if cost(chosen) >= cost(best[0]):
+            return
+        if not remaining:
+            best[0] = chosen
+            return
+        # Branch on the row with the fewest candidates covering it
+        for c in min(row_candidates.values(), key=len):
+            if nodes[0] <= 0 or time.monotonic() > deadline:
+                return
+            nodes[0] -= 1
+            search(*reduce(remaining & ~covers[c], candidates, chosen + [c]))
+
+    search(remaining, candidates, chosen, row_candidates)
+    return best[0]
+
+
+# Espresso works on covers, which are lists of cubes. Here a cube is a tuple
+# (ones, zeros) of ints where bit i is set in ones if symbol len(symbols) - i - 1
+# can be TRUE in the cube and set in zeros if it can be FALSE. A symbol with
+# both bits set doesn't appear in the cube. full has every bit set, so
+# (full, full) is the cube containing everything.
+
+
+def _espresso(expr, symbols, iterations):
+    """
+    Return a list of (value, dont_care) cubes covering expr.
+    """
+    length = len(symbols)
+    full = (1 << length) - 1
+    bits = {s: 1 << (length - i - 1) for i, s in enumerate(symbols)}
+    on = _expression_cover(expr, bits, full, {})
+    cover = _irredundant(_expand(on, on, full), full)
+    cost = _cover_cost(cover, full)
+    for _ in range(iterations):
+        new_cover = _irredundant(_expand(_reduce(cover, full), on, full), full)
+        new_cost = _cover_cost(new_cover, full)
+        if new_cost >= cost:
+            break
+        cover, cost = new_cover, new_cost
+    return [(ones & ~zeros, ones & zeros) for ones, zeros in cover]
+
+
+def _expression_cover(expr, bits, full, covers):
+    """
+    Return a cover of expr.
+
+    covers stores the covers of subexpressions that have been seen already.
+    """
+    if expr in covers:
+        return covers[expr]
+    ops = expr.algebra.operations
+    if isinstance(expr, BaseElement):
+        cover = [(full, full)] if expr else []
+    elif isinstance(expr, Symbol):
+        cover = [(full, full & ~bits[expr])]
+    elif isinstance(expr, ops.NOT):
+        cover = _complement(
+            _expression_cover(expr.args[0], bits, full, covers), full)
+    elif isinstance(expr, ops.AND):
+        cover = [(full, full)]
+        for arg in expr.args:
+            arg_cover = _expression_cover(arg, bits, full, covers)
+            cover = _single_cube_containment(
+                [(o1 & o2, z1 & z2) for o1, z1 in cover for o2, z2 in arg_cover
+                 if (o1 & o2) | (z1 & z2) == full])
+    elif isinstance(expr, ops.OR):
+        cover = []
+        for arg in expr.args:
+            cover.extend(_expression_cover(arg, bits, full, covers))
+        cover = _single_cube_containment(cover)
+    else:
+        raise TypeError("Can't minimize %s." % expr.__class__.__name__)
+    covers[expr] = cover
+    return cover
+
+
+def _literal_count(cube, full):
+    return bin(full & ~(cube[0] & cube[1])).count("1")
+
+
+def _cover_cost(cover, full):
+    return (len(cover), sum(_literal_count(c, full) for c in cover))
+
+
+def _single_cube_containment(cover):
+    """
+    Return a cover without cubes contained in other cubes of the cover.
+    """
+    result = []
+    # Larger cubes are never contained in smaller ones, so check them first
+    for ones, zeros in sorted(set(cover),
+                              key=lambda c: -bin(c[0] & c[1]).count("1")):
+        if not any(ones & ~o == 0 and zeros & ~z == 0 for o, z in result):
+            result.append((ones, zeros))
+    return result
+
+
+def _cofactor(cover, cube, full):
+    """
+    Return the cofactor of a cover with respect to a cube.
+    """
+    ones, zeros = cube
+    fixed = full & ~(ones & zeros)
+    return [(o | fixed, z | fixed) for o, z in cover
+            if (o & ones) | (z & zeros) == full]
+
+
+def _binate_bit(cover, full):
+    """
+    Return the bit to split a cover on and whether the cover is unate.
+
+    The bit of the symbol appearing in both polarities in the most cubes is
+    chosen, otherwise the one appearing in the most cubes.
+    """
+    positive = negative = 0
+    for ones, zeros in cover:
+        positive |= full & ~zeros
+        negative |= full & ~ones
+    binate = positive & negative
+    candidates = binate if binate else positive | negative
+    counts = {}
+    for ones, zeros in cover:
+        for b in _bits(candidates & ~(ones & zeros)):
+            counts[b] = counts.get(b, 0) + 1
+    return max(counts, key=counts.get), not binate
+
+
+def _components(cover, full):
+    """
+    Return a list of covers whose union is the cover and whose cubes don't
+    share any symbols with cubes of other covers.
+    """
+    components = []
+    for cube in cover:
+        support = full & ~(cube[0] & cube[1])
+        cubes = [cube]
+        others = []
+        for other_support, other_cubes in components:
+            if other_support & support:
+                support |= other_support
+                cubes.extend(other_cubes)
+            else:
+                others.append((other_support, other_cubes))
+        others.append((support, cubes))
+        components = others
+    return [cubes for support, cubes in components]
+
+
+def _complement(cover, full):
+    """
+    Return a cover of everything not in a cover.
+
+    This uses the unate recursive paradigm: the cover is split on a symbol
+    until it is trivial to complement and the results are merged.
+    """
+    if not cover:
+        return [(full, full)]
+    if (full, full) in cover:
+        return []
+    if len(cover) == 1:
+        # De Morgan: One cube for each literal with the opposite polarity
+        ones, zeros = cover[0]
+        return [(full & ~b, full) if ones & b else (full, full & ~b)
+                for b in _bits(full & ~(ones & zeros))]
+    bit = _binate_bit(cover, full)[0]
+    complement1 = _complement(_cofactor(cover, (full, full & ~bit), full), full)
+    complement0 = _complement(_cofactor(cover, (full & ~bit, full), full), full)
+    common = set(complement1) & set(complement0)
+    result = list(common)
+    result.extend((o, z & ~bit) for o, z in complement1 if (o, z) not in common)
+    result.extend((o & ~bit, z) for o, z in complement0 if (o, z) not in common)
+    return _single_cube_containment(result)
+
+
+def _tautology(cover, full):
+    """
+    Return True if a cover contains everything.
+    """
+    return _uncovered_cube(cover, full) is None
+
+
+def _uncovered_cube(cover, full):
+    """
+    Return a cube which doesn't intersect a cover.
+
+    Returns None if the cover contains everything. The cover is split on a
+    symbol until it is unate or falls apart into covers with no shared
+    symbols, stopping as soon as an uncovered cube is found.
+    """
+    if not cover:
+        return (full, full)
+    if (full, full) in cover:
+        return None
+    bit, unate = _binate_bit(cover, full)
+    if unate:
+        # Every cube of a unate cover has a literal which is FALSE when each
+        # symbol takes the polarity it doesn't appear in
+        positive = negative = 0
+        for ones, zeros in cover:
+            positive |= full & ~zeros
+            negative |= full & ~ones
+        return (full & ~positive, full & ~negative)
+    components = _components(cover, full)
+    if len(components) > 1:
+        # A point is uncovered if it is uncovered by every component
+        uncovered_ones = uncovered_zeros = full
+        for component in components:
+            cube = _uncovered_cube(component, full)
+            if cube is None:
+                return None
+            uncovered_ones &= cube[0]
+            uncovered_zeros &= cube[1]
+        return (uncovered_ones, uncovered_zeros)
+    # The half with fewer cubes is more likely to have something uncovered
+    halves = [(full, full & ~bit), (full & ~bit, full)]
+    cofactors = [_cofactor(cover, half, full) for half in halves]
+    if len(cofactors[1]) < len(cofactors[0]):
+        halves.reverse()
+        cofactors.reverse()
+    for half, cofactor in zip(halves, cofactors):
+        cube = _uncovered_cube(cofactor, full)
+        if cube is not None:
+            return (cube[0] & half[0], cube[1] & half[1])
+    return None
+
+
+def _expand(cover, on, full):
+    """
+    Return a cover where each cube is made as large as possible while staying
+    inside the on cover. Cubes contained in expanded ones are dropped.
+
+    Espresso checks expanded cubes against a cover of the complement, but
+    that can be exponentially larger than the on cover, so each expanded cube
+    is instead checked to be contained in the on cover. As the cube is
+    already contained, only the half added by removing the literal is
+    checked.
+    """
+    result = []
+    for cube in sorted(cover, key=lambda c: _literal_count(c, full)):
+        ones, zeros = cube
+        if any(ones & ~o == 0 and zeros & ~z == 0 for o, z in result):
+            continue
+        for bit in _bits(full & ~(ones & zeros)):
+            added = (ones ^ bit, zeros ^ bit)
+            if _tautology(_cofactor(on, added, full), full):
+                ones, zeros = ones | bit, zeros | bit
+        result.append((ones, zeros))
+    return _single_cube_containment(result)
+
+
+def _irredundant(cover, full):
+    """
+    Return a cover without cubes covered by the rest of the cover.
+    """
+    result = list(cover)
+    for cube in sorted(cover, key=lambda c: -_literal_count(c, full)):
+        others = [c for c in result if c != cube]
+        if _tautology(_cofactor(others, cube, full), full):
+            result = others
+    return result
+
+
+def _reduce(cover, full):
+    """
+    Return a cover where each cube is made as small as possible while the
+    cover still covers the same things.
+    """
+    cover = sorted(cover, key=lambda c: _literal_count(c, full))
+    result = []
+    for i, (ones, zeros) in enumerate(cover):
+        others = result + cover[i + 1:]
+        # Smallest cube containing the part only this cube covers
+        supercube = _complement_supercube(
+            _cofactor(others, (ones, zeros), full), full)
+        if supercube is None:
+            # The cube is covered by the others
+            continue
+        result.append((ones & supercube[0], zeros & supercube[1]))
+    return result
+
+
+def _complement_supercube(cover, full):
+    """
+    Return the smallest cube containing the complement of a cover.
+
+    Returns None if the complement is empty. Uncovered cubes are searched for
+    until every literal of the supercube has been found or shown to be
+    impossible, so the complement itself is never built.
+    """
+    cube = _uncovered_cube(cover, full)
+    if cube is None:
+        return None
+    super_ones, super_zeros = cube
+    for bit in _bits(full & ~(super_ones & super_zeros)):
+        if super_ones & super_zeros & bit:
+            # Found while looking for another literal
+            continue
+        if super_ones & bit:
+            half = (full & ~bit, full)
+        else:
+            half = (full, full & ~bit)
+        cube = _uncovered_cube(_cofactor(cover, half, full), full)
+        if cube is not None:
+            super_ones |= cube[0] & half[0]
+            super_zeros |= cube[1] & half[1]
+    return (super_ones, super_zeros)
+
+
+def _bits(n):
+    """
+    Returns a generator of the set bits of n as ints.
+    """
+    while n:
+        low = n & -n
+        yield low
+        n ^= low
+
+
 def symbols(*args):
     """
     Returns a Symbol for every argument given.
@@ -1154,6 +1930,97 @@ def parse(expr, eval=True):
     return expr
 
 
+def truth_table_columns(expr, symbols=None):
+    """
+    Returns every column of the truth table of an expression as an int.
+
+    Bit i of a column is the value of its subexpression in row i, where rows
+    are in the same order as in truth_table. symbols gives the order of the
+    variables and defaults to the symbols of expr sorted by name.
+
+    Each column is calculated with one bitwise operation per argument, so the
+    table is built in a single pass over the expression instead of once per
+    row. Returns a tuple of the symbols and a dictionary mapping each
+    subexpression to its column, in the order they are first seen.
+    """
+    if symbols is None:
+        symbols = sorted(expr.symbols, key=lambda e: str(e))
+    symbols = tuple(symbols)
+    full = (1 << (1 << len(symbols))) - 1
+    masks = dict(zip(symbols, _symbol_masks(len(symbols))))
+
+    ops = expr.algebra.operations
+    columns = {}
+    stack = [(expr, False)]
+    while stack:
+        e, visited = stack.pop()
+        if e in columns:
+            continue
+        if isinstance(e, BaseElement):
+            columns[e] = full if e else 0
+        elif isinstance(e, Symbol):
+            if e not in masks:
+                raise ValueError("Symbol %s is not given." % e)
+            columns[e] = masks[e]
+        elif not visited:
+            stack.append((e, True))
+            stack.extend((arg, False) for arg in reversed(e.args))
+        elif isinstance(e, ops.NOT):
+            columns[e] = full ^ columns[e.args[0]]
+        elif isinstance(e, ops.AND):
+            mask = full
+            for arg in e.args:
+                mask &= columns[arg]
+            columns[e] = mask
+        elif isinstance(e, ops.OR):
+            mask = 0
+            for arg in e.args:
+                mask |= columns[arg]
+            columns[e] = mask
+        else:
+            raise TypeError("Can't evaluate %s." % e.__class__.__name__)
+
+    return symbols, {e: columns[e] for e in _subexpressions(expr)}
+
+
+def _symbol_masks(length):
+    """
+    Returns the truth table columns of length symbols as ints.
+    """
+    rows = 1 << length
+    masks = []
+    for i in range(length):
+        # The symbol alternates between blocks of FALSE and TRUE rows.
+        block = 1 << (length - i - 1)
+        mask = ((1 << block) - 1) << block
+        width = 2 * block
+        while width < rows:
+            mask |= mask << width
+            width *= 2
+        masks.append(mask)
+    return masks
+
+
+def _subexpressions(expr):
+    """
+    Returns a list of all distinct subexpressions in preorder.
+
+    This is the order of the columns of a truth table.
+    """
+    subexpressions = []
+    seen = set()
+    stack = [expr]
+    while stack:
+        e = stack.pop()
+        if e in seen:
+            continue
+        seen.add(e)
+        subexpressions.append(e)
+        if e.args is not None:
+            stack.extend(reversed(e.args))
+    return subexpressions
+
+
 def truth_table(expr, format_str=False):
     """
     Returns a truth table from an expression, which may be a string or Expression.
@@ -1174,32 +2041,58 @@ def truth_table(expr, format_str=False):
     if isinstance(expr, BaseElement):
         return [{expr:expr}]
 
-    def truth_table_permutations(expr, symbols, values, format_str=True):
-        def replace(expr, symbols, values, format_str=True):
-            sub = {symbols[i]: values[i]
-                   for i in range(len(symbols)) if symbols[i] in expr.symbols}
-            if format_str:
-                return {str(expr): str(expr.subs(sub))}
-            else:
-                return {expr: expr.subs(sub)}
-
-        if isinstance(expr, Symbol):
-            return replace(expr, symbols, values, format_str)
-        return_dict = {}
-        if isinstance(expr, Function):
-            return_dict = replace(expr, symbols, values, format_str)
-            for args in expr.args:
-                return_dict.update(
-                    truth_table_permutations(args, symbols, values, format_str))
-            return return_dict
-
     # Make the rows look slightly nicer
+    symbols, columns = truth_table_columns(expr)
+    length = 1 << len(symbols)
+    values = {"0": FALSE, "1": TRUE}
+    if format_str:
+        values = {"0": str(FALSE), "1": str(TRUE)}
+    headings = []
+    bits = []
+    for e, mask in columns.items():
+        # Constants aren't columns
+        if isinstance(e, BaseElement):
+            continue
+        headings.append(str(e) if format_str else e)
+        # Reversed binary string so that bits[i] is the value in row i
+        bits.append(format(mask, "0%sb" % length)[::-1])
+    return [{h: values[b[i]] for h, b in zip(headings, bits)}
+            for i in range(length)]
+
+
+def iter_truth_table(expr, format_str=False, start=0, stop=None):
+    """
+    Returns a generator of the rows of a truth table from an expression.
+
+    Rows are the same as the ones returned by truth_table and are generated
+    in the same order, starting with row start and ending before row stop.
+    Each row is calculated when it is needed, so the memory used doesn't
+    depend on the number of rows.
+    """
+    if isinstance(expr, str):
+        expr = parse(expr, eval=False)
+    if not isinstance(expr, Expression):
+        raise TypeError(
+            "Argument must be str or Expression but it is %s" % expr.__class__)
+    if start < 0 or (stop is not None and stop < 0):
+        raise ValueError("Rows must not be negative.")
+    if isinstance(expr, BaseElement):
+        return iter([{expr: expr}][start:stop])
+
+    columns = [e for e in _subexpressions(expr)
+               if not isinstance(e, BaseElement)]
     symbols = sorted(expr.symbols, key=lambda e: str(e))
-    rows = []
-    for values in itertools.product((FALSE, TRUE), repeat=len(symbols)):
-        rows.append(
-            truth_table_permutations(expr, symbols, values, format_str))
-    return rows
+    length = 1 << len(symbols)
+    stop = length if stop is None else min(stop, length)
+    functions = [c.compile(symbols, bitmask=True) for c in columns]
+    if format_str:
+        columns = [str(c) for c in columns]
+    values = (str(FALSE), str(TRUE)) if format_str else (FALSE, TRUE)
+
+    def rows():
+        for i in range(start, stop):
+            yield {c: values[f(i)] for c, f in zip(columns, functions)}
+    return rows()
 
 
 class BooleanAlgebra:
@@ -8,20 +8,90 @@ components ouput None by default.
 This module depends on boolean.py, which can be found at: 
 https://github.com/qqii/boolean.py
 """
+import collections
+import heapq
 import itertools
+import weakref
 
 import boolean
 
 
+class Inputs(dict):
+
+    """
+    The inputs of a component, mapping its symbols to the components connected
+    to them.
+
+    This is a dict that tells its component whenever a connection changes.
+    """
+    _component = None
+
+    def __init__(self, component, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._component = component
+
+    def _changed(self, removed=(), added=()):
+        # Unpickling sets the items before _component
+        if self._component is not None:
+            self._component._connections_changed(removed, added)
+
+    def __setitem__(self, key, value):
+        removed = (self[key],) if key in self else ()
+        super().__setitem__(key, value)
+        self._changed(removed, (value,))
+
+    def __delitem__(self, key):
+        value = self[key]
+        super().__delitem__(key)
+        self._changed((value,))
+
+    def clear(self):
+        removed = tuple(self.values())
+        super().clear()
+        self._changed(removed)
+
+    def pop(self, key, *args):
+        removed = (self[key],) if key in self else ()
+        value = super().pop(key, *args)
+        self._changed(removed)
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._changed((item[1],))
+        return item
+
+    def setdefault(self, key, default=None):
+        added = () if key in self else (default,)
+        value = super().setdefault(key, default)
+        self._changed((), added)
+        return value
+
+    def update(self, *args, **kwargs):
+        removed = tuple(self.values())
+        super().update(*args, **kwargs)
+        self._changed(removed, tuple(self.values()))
+
+
 class Component:
 
     """
     Base class for all cricuit components
     """
 
+    # Weak references to the circuit boards indexing the connections to this
+    # component, by id
+    _boards = None
+
     def __init__(self):
         self.inputs = {}
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Boards index their components again after being unpickled
+        state.pop("_boards", None)
+        return state
+
     def __contains__(self, comp):
         if comp in self.inputs.values():
             return True
@@ -36,6 +106,16 @@ class Component:
             expr=repr(self.expression),
             output=repr(self.output))
 
+    @property
+    def inputs(self):
+        return self._inputs
+
+    @inputs.setter
+    def inputs(self, inputs):
+        removed = tuple(self.__dict__.get("_inputs", {}).values())
+        self._inputs = Inputs(self, inputs)
+        self._connections_changed(removed, tuple(self._inputs.values()))
+
     @property
     def output(self):
         return None
@@ -44,6 +124,13 @@ class Component:
     def expression(self):
         return None
 
+    def _connections_changed(self, removed=(), added=()):
+        if self._boards:
+            for ref in self._boards.values():
+                board = ref()
+                if board is not None:
+                    board._reconnected(self, removed, added)
+
     @property
     def empty_input_keys(self):
         return tuple(k for k, v in self.inputs.items() if v is None)
@@ -60,14 +147,29 @@ class Component:
 
         This does not change the output of the components.
         """
-        for c in board.copy():
-            while self in c:
-                index = tuple(c.inputs.values()).index(self)
-                key = tuple(c.inputs.keys())[index]
-                c.inputs[key] = None
+        self._disconnect_readers(board)
         # fixes possible memory leak
         self.inputs = {k: None for k, v in self.inputs.items()}
 
+    def _disconnect_readers(self, board):
+        """
+        Disconnects the components in board from this component's output.
+
+        A CircuitBoard knows which components read this one, otherwise every
+        component in board is checked.
+        """
+        if isinstance(board, CircuitBoard):
+            readers = board.readers(self)
+        else:
+            readers = [c for c in board if self in c.inputs.values()]
+        for c in readers:
+            for key in [k for k, v in c.inputs.items() if v is self]:
+                c.inputs[key] = None
+
+
+# Gates with at most this many inputs are evaluated with a truth table
+LOOKUP_INPUTS = 6
+
 
 class Gate(Component):
 
@@ -92,14 +194,14 @@ class Gate(Component):
 
         if anonymous_symbols:
             new_input_dict = {}
-            for symbol in (s for s in expression.symbols.copy()):
-                           # if s.obj != None):
-                new_symbol = boolean.Symbol(None)
-                expression = expression.subs({symbol: new_symbol})
+            subs_dict = {}
+            for symbol in _symbol_order(expression):
+                new_symbol = subs_dict[symbol] = boolean.Symbol(None)
                 if input_dict.get(symbol) is not None:
                     new_input_dict[new_symbol] = input_dict[symbol]
                 elif input_dict.get(str(symbol)) is not None:
                     new_input_dict[new_symbol] = input_dict[str(symbol)]
+            expression = expression.subs(subs_dict, eval=False)
             input_dict = new_input_dict
         else:
             def symbol_if_string(e):
@@ -114,11 +216,41 @@ class Gate(Component):
                           for k, v in input_dict.items()}
 
         self._expression = expression
+        # The order in which input values are given to the compiled expression
+        self._symbols = tuple(_symbol_order(expression))
+        self._compile()
         # inputs maps symbols to components
         # This can make an output to itself
-        self.inputs = {s: None for s in expression.symbols}
+        self.inputs = {s: None for s in self._symbols}
         self.inputs.update(input_dict)
 
+    def _compile(self):
+        """
+        Works out how to evaluate the gate's expression.
+
+        Gates with at most LOOKUP_INPUTS inputs look their output up in their
+        truth table, kept as an int with a bit for each row. Otherwise the
+        compiled expression is called.
+        """
+        if len(self._symbols) <= LOOKUP_INPUTS:
+            _, columns = boolean.truth_table_columns(self._expression,
+                                                     self._symbols)
+            self._table = columns[self._expression]
+            self._evaluate = None
+        else:
+            self._table = None
+            self._evaluate = self._expression.compile(self._symbols)
+
+    def __getstate__(self):
+        state = Component.__getstate__(self)
+        # Compiled functions cannot be pickled
+        state.pop("_evaluate", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
+
     @property
     def output(self):
         return self._output
@@ -128,16 +260,32 @@ class Gate(Component):
         return self._expression
 
     def update(self):
-        inputs = self.inputs
+        self._output = self._compute()
 
+    def _compute(self):
+        """
+        Returns what the output would be for the current input values.
+        """
+        inputs = self.inputs
+        table = self._table
+
+        if table is not None:
+            # The first symbol is the most significant bit of the row
+            row = 0
+            for s in self._symbols:
+                v = inputs[s]
+                output = None if v is None else v.output
+                if output is None:
+                    return None
+                row = row << 1 | output
+            return bool(table >> row & 1)
         # If not any values in the dictionary are None
-        if not any(True for v in inputs.values()
-                   if v is None or v.output is None):
-            subs_dict = {k: v.output for k, v in inputs.items()
-                         if k in self.expression.symbols}
-            self._output = bool(self.expression.subs(subs_dict))
+        elif not any(True for v in inputs.values()
+                     if v is None or v.output is None):
+            return self._evaluate(
+                tuple(inputs[s].output for s in self._symbols))
         else:
-            self._output = None
+            return None
 
 
 # The following classes are just for ease of programming
@@ -269,11 +417,7 @@ class Input(Component):
 
     def remove(self, board):
         # inputs = {} for all Inputs
-        for c in board.copy():
-            if self in c:
-                index = tuple(c.inputs.values()).index(self)
-                key = tuple(c.inputs.keys())[index]
-                c.inputs[key] = None
+        self._disconnect_readers(board)
 
 
 class Switch(Input):
@@ -309,6 +453,194 @@ class Bulb(Output):
     pass
 
 
+class Clock(Input):
+
+    """
+    A clock.
+
+    Flip-flops store their input when a clock's output rises from False to
+    True.
+    """
+
+    def tick(self):
+        """
+        Toggles output.
+        """
+        self.output = not self.output
+
+
+class DFlipFlop(Component):
+
+    """
+    A D flip-flop.
+
+    Its output becomes the value of its D input when its CLK input rises from
+    False to True, and otherwise stays the same.
+    """
+
+    def __init__(self,
+                 d=None,
+                 clock=None,
+                 output=False):
+        Component.__init__(self)
+        self.inputs = {"D": d, "CLK": clock}
+        self._output = output
+        # The value of CLK at the last update
+        self._clock = None
+
+    @property
+    def output(self):
+        return self._output
+
+    def update(self):
+        clock = self.inputs["CLK"]
+        clock = None if clock is None else clock.output
+        if clock and self._clock is False:
+            d = self.inputs["D"]
+            self._output = None if d is None else d.output
+        self._clock = clock
+
+
+class DLatch(Component):
+
+    """
+    A D latch.
+
+    Its output follows its D input while its EN input is True, and stays the
+    same while EN is False.
+    """
+
+    def __init__(self,
+                 d=None,
+                 enable=None,
+                 output=False):
+        Component.__init__(self)
+        self.inputs = {"D": d, "EN": enable}
+        self._output = output
+
+    @property
+    def output(self):
+        return self._output
+
+    def update(self):
+        enable = self.inputs["EN"]
+        enable = None if enable is None else enable.output
+        if enable is None:
+            self._output = None
+        elif enable:
+            d = self.inputs["D"]
+            self._output = None if d is None else d.output
+
+
+def _bitwise_expression(expr, names):
+    """
+    Returns a python expression evaluating expr on ints of many vectors.
+
+    names maps symbols to python expressions giving their values and m is the
+    mask of every vector.
+    """
+    if isinstance(expr, boolean.BaseElement):
+        return "m" if expr else "0"
+    if isinstance(expr, boolean.Symbol):
+        return names[expr]
+    ops = expr.algebra.operations
+    if isinstance(expr, ops.NOT):
+        return "(m ^ %s)" % _bitwise_expression(expr.args[0], names)
+    if isinstance(expr, ops.AND):
+        operator = " & "
+    elif isinstance(expr, ops.OR):
+        operator = " | "
+    else:
+        raise TypeError("Can't compile %s." % expr.__class__.__name__)
+    return "(%s)" % operator.join(_bitwise_expression(arg, names)
+                                  for arg in expr.args)
+
+
+def _unwire(component):
+    """
+    Returns the component driving component through any wires.
+    """
+    while isinstance(component, Wire):
+        component = component.input
+    return component
+
+
+def _strongly_connected(graph):
+    """
+    Returns the strongly connected components of a graph as lists of nodes.
+
+    graph maps each node to a sequence of the nodes it has edges to, and edges
+    to nodes that aren't in graph are ignored. This is Tarjan's algorithm with
+    an explicit stack instead of recursion, so it takes linear time and works
+    on graphs of any depth.
+    """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        # The nodes being visited and how many of their edges have been
+        work = [root]
+        positions = [0]
+        while work:
+            node = work[-1]
+            edges = graph[node]
+            i = positions[-1]
+            while i < len(edges):
+                successor = edges[i]
+                i += 1
+                if successor not in graph:
+                    continue
+                if successor not in index:
+                    positions[-1] = i
+                    index[successor] = low[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append(successor)
+                    positions.append(0)
+                    break
+                if successor in on_stack and index[successor] < low[node]:
+                    low[node] = index[successor]
+            else:
+                work.pop()
+                positions.pop()
+                if work and low[node] < low[work[-1]]:
+                    low[work[-1]] = low[node]
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        n = stack.pop()
+                        on_stack.discard(n)
+                        component.append(n)
+                        if n is node:
+                            break
+                    component.reverse()
+                    components.append(component)
+    return components
+
+
+def _update_order(component):
+    """
+    Sort key for the order components are updated in: Inputs, Wires, Gates,
+    other components then Outputs.
+    """
+    if isinstance(component, Input):
+        return 0
+    if isinstance(component, Wire):
+        return 1
+    if isinstance(component, Gate):
+        return 2
+    if isinstance(component, Output):
+        return 4
+    return 3
+
+
 class CircuitBoard(list):
 
     """
@@ -316,14 +648,525 @@ class CircuitBoard(list):
 
     Components in a circuit board do not all have to be connected together.
     Circuit boards can be updated by calling update. This allows the signals to
-    propagate by 1 more component.
+    propagate by 1 more component. Alternatively propagate only updates the
+    components whose inputs have changed, until nothing changes.
 
     Splices of circuit boards should only be read from and not updated.
     """
+    # Incremented whenever the list changes. Unpickling appends the
+    # components before setting any attributes.
+    _version = 0
+    # Incremented whenever a connection to a component in the board changes
+    # while the fanout index is kept up to date.
+    _connection_version = 0
+    # Maps each component to the number of times it is in the board, and each
+    # component to the components in the board reading it with how many of
+    # their inputs do. Built the first time they are needed and then kept up to
+    # date as components and connections change.
+    _members = None
+    _fanout = None
 
     def __init__(self,
                  component_list=[]):
         super().__init__(component_list)
+        self._connections_key = None
+        self._readers = {}
+        self._inputs = ()
+        self._levels_key = None
+        self._levels = []
+        self._compiled_key = None
+        self._compiled = {}
+        # Pending work for propagate
+        self._propagated_key = None
+        self._queue = collections.deque()
+        self._queued = set()
+        self._input_outputs = {}
+        self._update_key = None
+        self._updates = []
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_ref", None)
+        state.pop("_members", None)
+        state.pop("_fanout", None)
+        # Compiled functions cannot be pickled
+        state["_compiled_key"] = None
+        state["_compiled"] = {}
+        return state
+
+    def _changed(self):
+        self._version += 1
+
+    def _index(self):
+        """
+        Returns the fanout index, building it if it hasn't been.
+        """
+        if self._fanout is None:
+            self._ref = weakref.ref(self)
+            self._members = {}
+            self._fanout = {}
+            self._added(self)
+        return self._fanout
+
+    def _connect(self, driver, reader):
+        if driver is not None:
+            readers = self._fanout.setdefault(driver, {})
+            readers[reader] = readers.get(reader, 0) + 1
+
+    def _disconnect(self, driver, reader):
+        if driver is not None:
+            readers = self._fanout[driver]
+            if readers[reader] == 1:
+                del readers[reader]
+                if not readers:
+                    del self._fanout[driver]
+            else:
+                readers[reader] -= 1
+
+    def _added(self, components):
+        if self._fanout is None:
+            return
+        members = self._members
+        for c in components:
+            count = members.get(c, 0)
+            members[c] = count + 1
+            if not count:
+                if "_boards" not in c.__dict__:
+                    c._boards = {}
+                c._boards[id(self)] = self._ref
+                for v in c.inputs.values():
+                    self._connect(v, c)
+
+    def _removed(self, components):
+        if self._fanout is None:
+            return
+        members = self._members
+        for c in components:
+            count = members.pop(c)
+            if count > 1:
+                members[c] = count - 1
+            else:
+                c._boards.pop(id(self), None)
+                for v in c.inputs.values():
+                    self._disconnect(v, c)
+
+    def _reconnected(self, component, removed, added):
+        """
+        Called by a component in the board after its inputs have changed.
+        """
+        self._connection_version += 1
+        for v in removed:
+            self._disconnect(v, component)
+        for v in added:
+            self._connect(v, component)
+
+    def append(self, component):
+        super().append(component)
+        self._changed()
+        self._added((component,))
+
+    def extend(self, components):
+        components = list(components)
+        super().extend(components)
+        self._changed()
+        self._added(components)
+
+    def insert(self, index, component):
+        super().insert(index, component)
+        self._changed()
+        self._added((component,))
+
+    def pop(self, *args):
+        component = super().pop(*args)
+        self._changed()
+        self._removed((component,))
+        return component
+
+    def clear(self):
+        removed = self.copy()
+        super().clear()
+        self._changed()
+        self._removed(removed)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            removed = self[index]
+            value = list(value)
+            added = value
+        else:
+            removed = (self[index],)
+            added = (value,)
+        super().__setitem__(index, value)
+        self._changed()
+        self._removed(removed)
+        self._added(added)
+
+    def __delitem__(self, index):
+        removed = self[index] if isinstance(index, slice) else (self[index],)
+        super().__delitem__(index)
+        self._changed()
+        self._removed(removed)
+
+    def __iadd__(self, components):
+        components = list(components)
+        result = super().__iadd__(components)
+        self._changed()
+        self._added(components)
+        return result
+
+    def __imul__(self, n):
+        removed = self.copy()
+        result = super().__imul__(n)
+        self._changed()
+        self._removed(removed)
+        self._added(self)
+        return result
+
+    def readers(self, component):
+        """
+        Returns the components in the board that component's output is
+        connected to.
+        """
+        return tuple(self._index().get(component, ()))
+
+    def drivers(self, component):
+        """
+        Returns the components in the board connected to component's inputs.
+        """
+        self._index()
+        members = self._members
+        return tuple(dict.fromkeys(v for v in component.inputs.values()
+                                   if v in members))
+
+    def _connections(self):
+        """
+        Returns a dictionary mapping each component to the components in the
+        board that read its output, and a tuple of the Inputs in the board.
+
+        These are taken from the fanout index again only after the board or a
+        connection to one of its components has changed.
+        """
+        fanout = self._index()
+        key = (self._version, self._connection_version)
+        if self._connections_key != key:
+            self._readers = {c: tuple(fanout.get(c, ())) for c in self}
+            self._inputs = tuple(c for c in self if isinstance(c, Input))
+            self._connections_key = key
+        return self._readers, self._inputs
+
+    def levels(self):
+        """
+        Returns the components in a list of levels, where each gate is in a
+        later level than every gate in the board driving it.
+
+        Components other than gates are sources in the first level, as are
+        gates with no drivers in the board. Raises RecursionError if the gates
+        form a loop. The levels are worked out again only after the board or
+        a connection has changed.
+        """
+        readers, _ = self._connections()
+        if self._levels_key == self._connections_key:
+            return self._levels
+        # Kahn's algorithm counting the gate drivers of each gate
+        pending = {}
+        for c in readers:
+            if isinstance(c, Gate):
+                pending[c] = 0
+        for c in pending:
+            for r in readers[c]:
+                if r in pending:
+                    pending[r] += 1
+        level = [c for c in readers if pending.get(c, 0) == 0]
+        levels = []
+        done = 0
+        while level:
+            levels.append(level)
+            done += len(level)
+            next_level = []
+            for c in level:
+                if c not in pending:
+                    continue
+                for r in readers[c]:
+                    if r in pending:
+                        pending[r] -= 1
+                        if pending[r] == 0:
+                            next_level.append(r)
+            level = next_level
+        if done != len(readers):
+            loops = self.loops()
+            raise RecursionError(
+                "The logic circuit has {} loops and cannot be levelised"
+                .format(len(loops)),
+                [c for loop in loops for c in loop])
+        self._levels = levels
+        self._levels_key = self._connections_key
+        return levels
+
+    def loops(self):
+        """
+        Returns the feedback loops between the gates in the board, as lists of
+        gates that all drive each other.
+
+        Components other than gates, such as flip-flops, break loops. The loops
+        are the strongly connected components of the connections, found in
+        linear time without recursion.
+        """
+        readers, _ = self._connections()
+        graph = {c: readers[c] for c in readers if isinstance(c, Gate)}
+        return [loop for loop in _strongly_connected(graph)
+                if len(loop) > 1 or loop[0] in readers[loop[0]]]
+
+    def _generate(self, kind):
+        """
+        Writes the source of a straight-line function updating every gate.
+
+        Returns the source, a namespace for it and the components it reads at
+        the start. kind is the function to write:
+            evaluate() reads outputs and sets the outputs of the gates.
+            simulate(words, m), where words are ints for the components read
+            and m is a mask of the vectors, returns a tuple of ints for the
+            levelised gates.
+            cycle(n) works out the gates and then clocks every flip-flop and
+            latch, n times over, and sets the outputs of the flip-flops and
+            latches.
+        """
+        levels = self.levels()
+        bitwise = kind == "simulate"
+        cycle = kind == "cycle"
+        never_none = self._never_none() if cycle else set()
+        namespace = {}
+        sources = []
+        reads = []
+        lines = []
+        results = []
+        # Maps components to the python names of their values, or None if
+        # their value is always None.
+        names = {}
+        maybe_none = set()
+
+        def variable(c):
+            name = "c%d" % len(namespace)
+            namespace[name] = c
+            return name
+
+        def read(c):
+            """
+            Reads a component at the start of the function.
+            """
+            name = "v%d" % len(sources)
+            if bitwise:
+                reads.append("    %s = words[%d]" % (name, len(sources)))
+            else:
+                reads.append("    %s = %s.output" % (name, variable(c)))
+            sources.append(c)
+            names[c] = name
+            if not isinstance(c, Input) and c not in never_none:
+                maybe_none.add(c)
+
+        def value(driver):
+            if driver is None:
+                return "None"
+            if driver not in names:
+                # Driven from outside the board
+                read(driver)
+            return names[driver] or "None"
+
+        indent = "        " if cycle else "    "
+        for c in itertools.chain.from_iterable(levels):
+            if not isinstance(c, Gate):
+                read(c)
+                continue
+            drivers = tuple(c.inputs.values())
+            for driver in drivers:
+                if driver is not None and driver not in names:
+                    read(driver)
+            if any(driver is None or names[driver] is None
+                   for driver in drivers):
+                # An input is unconnected or always None
+                names[c] = None
+                if bitwise:
+                    results.append("None")
+                elif not cycle:
+                    lines.append("    %s._output = None" % variable(c))
+                continue
+            args = {s: names[d] for s, d in c.inputs.items()}
+            if bitwise:
+                expr = _bitwise_expression(c.expression, args)
+            else:
+                expr = boolean._python_expression(c.expression, args)
+            checks = set(names[d] for d in drivers if d in maybe_none)
+            if checks:
+                maybe_none.add(c)
+                expr = "None if %s is None else %s" % (
+                    " is None or ".join(sorted(checks)), expr)
+            names[c] = "g%d" % len(lines)
+            if bitwise:
+                results.append(names[c])
+                lines.append("    %s = %s" % (names[c], expr))
+            elif cycle:
+                lines.append("        %s = %s" % (names[c], expr))
+            else:
+                lines.append("    %s = %s._output = %s"
+                             % (names[c], variable(c), expr))
+        if bitwise:
+            lines = ["def simulate(words, m):"] + reads + lines
+            lines.append("    return (%s)" % "".join(r + ", " for r in results))
+        elif cycle:
+            states = []
+            nexts = []
+            for c in list(sources):
+                if isinstance(c, DFlipFlop):
+                    if not isinstance(_unwire(c.inputs["CLK"]), Clock):
+                        raise ValueError(
+                            "{} is not clocked by a Clock".format(c))
+                    nexts.append(value(c.inputs["D"]))
+                elif isinstance(c, DLatch):
+                    enable = c.inputs["EN"]
+                    if isinstance(_unwire(enable), Clock):
+                        # Enabled once every cycle
+                        nexts.append(value(c.inputs["D"]))
+                    elif value(enable) == "None":
+                        nexts.append("None")
+                    elif enable in maybe_none:
+                        nexts.append("None if %s is None else %s if %s else %s"
+                                     % (names[enable], value(c.inputs["D"]),
+                                        names[enable], names[c]))
+                    else:
+                        nexts.append("%s if %s else %s"
+                                     % (value(c.inputs["D"]), names[enable],
+                                        names[c]))
+                else:
+                    continue
+                states.append(c)
+            body = lines
+            lines = ["def cycle(n):"] + reads
+            if states:
+                lines.append("    for _ in range(n):")
+                lines += body
+                # Every flip-flop and latch is clocked at once
+                lines.append("        %s= %s," % (
+                    "".join(names[c] + ", " for c in states),
+                    ", ".join(nexts)))
+            lines += ["    %s._output = %s" % (variable(c), names[c])
+                      for c in states]
+            lines.append("    return")
+        else:
+            lines = ["def evaluate():"] + reads + lines
+            lines.append("    return")
+        return "\n".join(lines), namespace, sources
+
+    def _never_none(self):
+        """
+        Returns the flip-flops and latches in the board whose outputs are never
+        None while cycling the board.
+
+        These start with a value and only ever store values that can't be None
+        when they have values.
+        """
+        gates = [c for c in itertools.chain.from_iterable(self.levels())
+                 if isinstance(c, Gate)]
+        states = [c for c in self if isinstance(c, (DFlipFlop, DLatch))]
+        never_none = set(c for c in states if c.output is not None)
+        while True:
+            def none(c):
+                return (c is None or c in maybe_none or
+                        not isinstance(c, (Input, Gate)) and
+                        c not in never_none)
+            maybe_none = set()
+            for c in gates:
+                if any(none(d) for d in c.inputs.values()):
+                    maybe_none.add(c)
+            changed = [c for c in never_none
+                       if any(none(d) for d in c.inputs.values()
+                              if d is not c.inputs.get("CLK", d))]
+            if not changed:
+                return never_none
+            never_none.difference_update(changed)
+
+    def _compiled_cache(self):
+        """
+        Returns a dictionary for things compiled from the levelised board,
+        which is emptied when the board or a connection changes.
+        """
+        self.levels()
+        if self._compiled_key != self._levels_key:
+            self._compiled = {}
+            self._compiled_key = self._levels_key
+        return self._compiled
+
+    def _compile(self, kind):
+        cache = self._compiled_cache()
+        if kind not in cache:
+            source, namespace, sources = self._generate(kind)
+            exec(source, namespace)
+            gates = [c for c in itertools.chain.from_iterable(self.levels())
+                     if isinstance(c, Gate)]
+            cache[kind] = (namespace[kind], sources, gates)
+        return cache[kind]
+
+    def compile(self):
+        """
+        Returns a function that updates every gate in the board at once.
+
+        The gates are levelised and each gate's expression is written out in
+        one straight-line function, so calling it gives the same outputs as
+        calling update until they stop changing. The function is compiled
+        again when the board or a connection has changed. Raises
+        RecursionError if the gates form a loop.
+        """
+        return self._compile("evaluate")[0]
+
+    def evaluate(self):
+        """
+        Updates every gate in the board so that the outputs stop changing, in
+        a single call to the function from compile.
+        """
+        self.compile()()
+
+    def simulate(self, inputs, count):
+        """
+        Simulates count input vectors at once without changing any outputs.
+
+        inputs maps components to ints, where bit i is the component's output
+        in vector i. Components that aren't given keep their current output in
+        every vector. Every gate works on all of the vectors at once with a
+        few bitwise operations on Python ints, so thousands of vectors cost
+        little more than one.
+
+        Returns a dictionary mapping every component in the board, and those
+        driving it, to an int of its outputs, or to None if it is None.
+        """
+        function, sources, gates = self._compile("simulate")
+        mask = (1 << count) - 1
+        words = []
+        for c in sources:
+            if c in inputs:
+                words.append(inputs[c] & mask)
+            elif c.output is None:
+                words.append(None)
+            else:
+                words.append(mask if c.output else 0)
+        outputs = dict(zip(sources, words))
+        outputs.update(zip(gates, function(words, mask)))
+        return outputs
+
+    def cycle(self, count=1):
+        """
+        Simulates count clock cycles.
+
+        In each cycle the gates are worked out from the outputs of the
+        flip-flops and latches, then every flip-flop stores its D input at once
+        as if its clock had risen. Latches enabled by a Clock store their D
+        input every cycle and other latches do while EN is True. The cycles
+        run in one compiled function that keeps the flip-flops and latches in
+        local variables, and the gates are updated from them at the end.
+
+        Every flip-flop must be clocked by a Clock, possibly through wires.
+        Raises ValueError if one isn't, or RecursionError if the gates form a
+        loop.
+        """
+        self._compile("cycle")[0](count)
+        self.evaluate()
 
     def update(self):
         """
@@ -336,105 +1179,387 @@ class CircuitBoard(list):
             Other Components
             Outputs
         """
-        def sort_key(component):
-            if isinstance(component, Input):
-                return 0
-            if isinstance(component, Wire):
-                return 1
-            if isinstance(component, Gate):
-                return 2
-            if isinstance(component, Output):
-                return 4
-            return 3
-        for c in sorted(self, key=sort_key):
+        for c in self._update_list():
             c.update()
 
+    def _update_list(self):
+        """
+        Returns the components in the order update updates them, sorting them
+        again only after the board has changed.
+        """
+        if self._update_key != self._version:
+            self._updates = sorted(self, key=_update_order)
+            self._update_key = self._version
+        return self._updates
+
+    def settle(self, max_steps=None):
+        """
+        Updates the board until no outputs change.
+
+        A board without loops is evaluated first, so that it only needs one
+        more update to check it has settled. Otherwise, each update's outputs
+        are hashed. If the board gets back to outputs it has had before it would
+        go round the same states forever, so OscillationError is raised with
+        the components whose outputs keep changing.
+
+        Returns True once the outputs stop changing, or False if they are still
+        changing after max_steps updates.
+        """
+        try:
+            self.evaluate()
+        except RecursionError:
+            pass
+        components = list(dict.fromkeys(self))
+        updates = self._update_list()
+        state = tuple(c.output for c in components)
+        seen = {hash(state): 0}
+        step = 0
+        while max_steps is None or step < max_steps:
+            for c in updates:
+                c.update()
+            step += 1
+            outputs = tuple(c.output for c in components)
+            if outputs == state:
+                return True
+            state = outputs
+            h = hash(state)
+            if h in seen:
+                # Go round once more to check the states really repeat and to
+                # see which outputs change on the way.
+                period = step - seen[h]
+                changing = set()
+                for _ in range(period):
+                    for c in updates:
+                        c.update()
+                    changing.update(c for c, o in zip(components, state)
+                                    if c.output is not o)
+                step += period
+                outputs = tuple(c.output for c in components)
+                if outputs == state:
+                    raise OscillationError(
+                        [c for c in components if c in changing], period)
+                state = outputs
+                h = hash(state)
+            seen[h] = step
+        return False
+
+    def propagate(self, components=(), max_events=None):
+        """
+        Updates the components whose inputs have changed until no outputs
+        change.
+
+        components are components in the board whose outputs have been changed
+        from outside, although Inputs are checked for changes anyway. Only the
+        components reading a changed output are updated, so the work done
+        depends on how many signals change rather than the size of the board.
+        The first time, and after the board or a connection has changed, every
+        component is updated.
+
+        A circuit with a loop might never stop changing, so max_events limits
+        the number of components updated. Returns True if the outputs have
+        stopped changing, otherwise the next call carries on where this one
+        stopped.
+        """
+        readers, inputs = self._connections()
+        queue = self._queue
+        queued = self._queued
+
+        def enqueue(c):
+            if c not in queued:
+                queued.add(c)
+                queue.append(c)
+
+        if self._propagated_key != self._connections_key:
+            self._propagated_key = self._connections_key
+            queue.clear()
+            queued.clear()
+            for c in self._update_list():
+                enqueue(c)
+        else:
+            input_outputs = self._input_outputs
+            changed = [i for i in inputs
+                       if input_outputs.get(i) is not i.output]
+            for c in itertools.chain(changed, components):
+                for r in readers.get(c, ()):
+                    enqueue(r)
+        self._input_outputs = {i: i.output for i in inputs}
+
+        events = 0
+        while queue:
+            if max_events is not None and events >= max_events:
+                return False
+            c = queue.popleft()
+            queued.discard(c)
+            output = c.output
+            c.update()
+            events += 1
+            if c.output is not output:
+                for r in readers[c]:
+                    enqueue(r)
+        return True
+
+    def press(self, switch):
+        """
+        Presses a switch and propagates the change through the board.
+        """
+        switch.press()
+        return self.propagate((switch,))
+
     def remove(self, value):
         super().remove(value)
+        self._changed()
+        self._removed((value,))
         value.remove(self)
 
+    def remove_all(self, components):
+        """
+        Removes components from the board, disconnecting them like remove.
+
+        This goes through the board once however many components are removed.
+        """
+        components = set(components)
+        removed = [c for c in self if c in components]
+        super().__setitem__(slice(None), [c for c in self
+                                          if c not in components])
+        self._changed()
+        self._removed(removed)
+        for c in removed:
+            c.remove(self)
+
 
-# TODO: Make this accept the component in question
 class RecursionError(Exception):
 
     """
     This is thrown instated of a StackOverflow.
+
+    components are the components in the loop, if they are known.
     """
-    pass
+
+    def __init__(self, message="", components=()):
+        super().__init__(message)
+        self.components = components
+
+
+class OscillationError(Exception):
+
+    """
+    This is thrown when a circuit board keeps going round the same states.
+
+    components are the components whose outputs keep changing and period is
+    the number of updates before the states repeat.
+    """
+
+    def __init__(self, components, period):
+        super().__init__("{} components oscillate every {} updates"
+                         .format(len(components), period))
+        self.components = components
+        self.period = period
+
+
+def _symbol_order(expr):
+    """
+    Returns the symbols of an expression in the order they first appear.
+    """
+    symbols = {}
+    stack = [expr]
+    while stack:
+        e = stack.pop()
+        if isinstance(e, boolean.Symbol):
+            symbols[e] = None
+        elif e.args:
+            stack.extend(reversed(e.args))
+    return list(symbols)
+
+
+def _letters():
+    """
+    Returns a generator that outputs A^n->Z^n for n->inf.
+    Where <letter>^n = <letter><letter>^(n-1)
+    """
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    for n in itertools.count(1):
+        for s in itertools.product(letters, repeat=n):
+            yield "".join(s)
 
 
-def expression(component, anonymous_symbols=False):
+def expression(component, anonymous_symbols=False, shared=False):
     """
     Takes a component and converts it into an expression.
 
+    Each gate is converted once, so a gate driving several others is the same
+    subexpression in each of them. If shared is True, gates that are used more
+    than once are replaced by new symbols instead, and a tuple of the
+    expression and a dictionary mapping those symbols to the expressions they
+    stand for is returned. Each of these expressions only uses the symbols
+    before it in the dictionary.
+
+    Inputs and other components that aren't gates, like flip-flops, become
+    symbols, and so does each unconnected input. Unless anonymous_symbols is
+    True the symbols are named A, B, C... in the order they are found.
+
     This function raises RecursionError if any component is self referencing.
     """
-    # <x> in set() is faster than list
-    seen = set()
-    # An input can output into multiple components
-    # This maps inputs -> symbols
-    component_dict = {}
-
-    def recursive_expression(c):
+    def inputs(c):
         """
-        Recursively creates an expression from a component.
-
-        his function raises RecursionError if any component is self referencing.
+        Returns the components connected to a gate, in the order their symbols
+        appear in its expression.
         """
-        if c in (None, True, False):
-            # The component is not connected to anything
-            # Act as if they are connected to an input
-            return boolean.Symbol(None)
-        elif c in seen:
-            raise RecursionError(
-                "The logic circuit is self referencing and cannot be converted into a boolean expression")
-
-        if not isinstance(c, Input):
-            # Inputs can appear twice in the circuit
-            seen.add(c)
+        if isinstance(c, Wire):
+            return (c.input,)
+        elif isinstance(c, Gate):
+            return tuple(c.inputs[s] for s in c._symbols)
+        return ()
 
-        if isinstance(c, Input):
-            if c in component_dict.keys():
-                return component_dict[c]
-            else:
-                component_dict[c] = boolean.Symbol(None)
-                return component_dict[c]
-        elif isinstance(c, (Output, Wire)):
-            # Wires don't matter
-            return recursive_expression(c.input)
+    # Go through the components depth first, driving components before the
+    # components they drive, without recursion.
+    order = []
+    uses = collections.Counter({component: 1})
+    done = set()
+    path = []
+    on_path = set()
+    stack = [component]
+    while stack:
+        c = stack[-1]
+        if c in done:
+            stack.pop()
+        elif c in on_path:
+            stack.pop()
+            path.pop()
+            on_path.discard(c)
+            done.add(c)
+            order.append(c)
+        else:
+            path.append(c)
+            on_path.add(c)
+            drivers = [d for d in inputs(c) if d is not None]
+            for d in reversed(drivers):
+                uses[d] += 1
+                if d in on_path:
+                    raise RecursionError(
+                        "The logic circuit is self referencing and cannot be converted into a boolean expression",
+                        path[path.index(d):])
+                if d not in done:
+                    stack.append(d)
+
+    # A wire passes all its uses on to what drives it
+    for c in reversed(order):
+        if isinstance(c, Wire) and c.input is not None:
+            uses[c.input] += uses[c] - 1
+
+    letters = _letters()
+
+    def new_symbol():
+        return boolean.Symbol(None if anonymous_symbols else next(letters))
+
+    expressions = {}
+    definitions = {}
+    for c in order:
+        if c is None:
+            expressions[c] = new_symbol()
+        elif isinstance(c, Wire):
+            d = c.input
+            expressions[c] = new_symbol() if d is None else expressions[d]
         elif isinstance(c, Gate):
             subs_dict = {}
-            for k, v in c.inputs.items():
-                subs_dict[k] = recursive_expression(v)
-            return c.expression.subs(subs_dict, eval=False)
+            for s in c._symbols:
+                d = c.inputs[s]
+                subs_dict[s] = new_symbol() if d is None else expressions[d]
+            expr = c.expression.subs(subs_dict, eval=False)
+            if shared and uses[c] > 1:
+                symbol = new_symbol()
+                definitions[symbol] = expr
+                expr = symbol
+            expressions[c] = expr
+        else:
+            # Inputs can appear twice in the circuit
+            expressions[c] = new_symbol()
+    if shared:
+        return expressions[component], definitions
+    return expressions[component]
 
-    if anonymous_symbols:
-        return recursive_expression(component)
-    else:
-        def letters_generator():
-            """
-            Returns a generator that outputs A^n->Z^n for n->inf.
-            Where <letter>^n = <letter><letter>^(n-1)
-            """
-            def multiletters(seq):
-                for n in itertools.count(1):
-                    for s in itertools.product(seq, repeat=n):
-                        yield "".join(s)
-            letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-            return multiletters(letters)
 
-        expression = recursive_expression(component)
-        subs_dict = {}
-        g = letters_generator()
-        for s in expression.symbols:
-            subs_dict[s] = boolean.Symbol(g.__next__())
+def synthesis_plan(expression, fan_in=LOOKUP_INPUTS):
+    """
+    Works out the gates needed to build an expression.
+
+    Returns a list of nodes in the order they need to be built and the index
+    of the node giving the value of the whole expression. Each node is a pair
+    of a symbol or constant and an empty tuple, or a function class and the
+    indices of the nodes that are its arguments.
 
-        return expression.subs(subs_dict, eval=False)
+    Subexpressions that are structurally the same are only built once, and
+    ANDs and ORs reuse gates already built over some of their arguments, so
+    (A*B)+(A*B*C)+~(A*B) builds A*B once. ANDs and ORs with more than fan_in
+    arguments become balanced trees.
+    """
+    if fan_in < 2:
+        raise ValueError("fan_in must be at least 2 but is {}".format(fan_in))
+    nodes = []
+    # Maps expressions to nodes, which uses the structural hash of expressions
+    index = {}
+    # Maps function class to the sets of arguments already built with it
+    duals = {}
+    # Maps function class and argument to the sets of arguments containing it
+    containing = {}
+
+    def node(e, args):
+        nodes.append((e, args))
+        return len(nodes) - 1
+
+    def dual(cls, args):
+        """
+        Returns a node for cls over the nodes in args.
+        """
+        args = frozenset(args)
+        if len(args) == 1:
+            return next(iter(args))
+        built = duals.setdefault(cls, {})
+        while args not in built:
+            # Use the largest gate already built over some of the arguments
+            best = frozenset()
+            for a in args:
+                for other in containing.get((cls, a), ()):
+                    if len(best) < len(other) < len(args) and other <= args:
+                        best = other
+            if not best:
+                break
+            args = (args - best) | {built[best]}
+        if args in built:
+            return built[args]
+        ordered = sorted(args)
+        if len(ordered) > fan_in:
+            n = len(ordered)
+            ordered = sorted(dual(cls, ordered[i * n // fan_in:
+                                             (i + 1) * n // fan_in])
+                             for i in range(fan_in))
+        i = node(cls, tuple(ordered))
+        built[args] = i
+        for a in args:
+            containing.setdefault((cls, a), []).append(args)
+        return i
+
+    stack = [(expression, False)]
+    while stack:
+        e, ready = stack.pop()
+        if e in index:
+            continue
+        if isinstance(e, (boolean.BaseElement, boolean.Symbol)):
+            index[e] = node(e, ())
+        elif not ready:
+            stack.append((e, True))
+            stack.extend((arg, False) for arg in reversed(e.args))
+        elif isinstance(e, boolean.DualBase):
+            index[e] = dual(e.__class__, (index[arg] for arg in e.args))
+        else:
+            index[e] = node(e.__class__, tuple(index[arg] for arg in e.args))
+    return nodes, index[expression]
 
 
 def circuit_board(expression, bulb=True, eval=False):
     """
     Takes an expression and converts it into a circuit board.
+
+    Gates are shared between subexpressions, see synthesis_plan.
     """
     if isinstance(expression, str):
         expression = boolean.parse(expression, eval=eval)
@@ -445,58 +1570,386 @@ def circuit_board(expression, bulb=True, eval=False):
 
     # A list would work equally as well
     b = CircuitBoard()
-    # A symbol can exist multiple times in an expression
-    symbol_dict = {}
-
-    def recursive_gate(e):
-        """
-        Recursively adds components to the circuit board.
-        """
-        if isinstance(e, boolean.BaseElement):
+    nodes, root = synthesis_plan(expression)
+    components = []
+    # Every input of a gate driven by the same component shares a wire
+    wires = {}
+    for e, args in nodes:
+        if not args:
             # TODO: Either make the the same or create a constant component.
-            s = Switch()
-            b.append(s)
-            return s
-        elif isinstance(e, boolean.Symbol):
-            if e in symbol_dict.keys():
-                return symbol_dict[e]
-            else:
-                s = Switch()
-                symbol_dict[e] = s
-                b.append(s)
-                return s
-        elif isinstance(e, boolean.Function):
+            c = Switch()
+        else:
             # All gates are of type Gate instead of And, Or and Not
-            if e.order == (1, 1):
-                pre = recursive_gate(e.args[0])
-                w = Wire(pre)
-                b.append(w)
-
-                s = boolean.Symbol(None)
-                g = Gate(e.subs({e.args[0]: s}),
-                         {s: w})
-                b.append(g)
-                return g
-            else:
-                input_dict = {}
-                expr = e
-                for arg in e.args:
-                    pre = recursive_gate(arg)
-                    w = Wire(pre)
-                    b.append(w)
-
-                    s = boolean.Symbol(None)
-                    expr = expr.subs({arg: s})
-                    input_dict[s] = w
-                g = Gate(expr,
-                         input_dict)
-                b.append(g)
-                return g
-    recursive_gate(expression)
+            symbols = [boolean.Symbol(None) for _ in args]
+            input_dict = {}
+            for s, i in zip(symbols, args):
+                if i not in wires:
+                    wires[i] = Wire(components[i])
+                    b.append(wires[i])
+                input_dict[s] = wires[i]
+            c = Gate(e(*symbols, eval=False), input_dict)
+        b.append(c)
+        components.append(c)
     if bulb:
-        # Due to the nature of recursive_gate, the last component is last in the list
-        w = Wire(b[-1])
-        o = Bulb(w)
-        b.append(w)
-        b.append(o)
+        w = wires.get(root)
+        if w is None:
+            w = Wire(components[root])
+            b.append(w)
+        b.append(Bulb(w))
     return b
+
+
+def _batch_plan(board, numpy):
+    """
+    Returns a plan for simulate_batch: the Inputs, the other sources and a
+    list of groups of gates for each level, all as rows of a signal matrix.
+
+    Each group is a function and arrays of the rows of its gates and of the
+    rows driving each of their symbols. Gates in a level with the same
+    expression, with their symbols in order, share one group.
+    """
+    rows = {}
+    inputs = []
+    sources = []
+
+    def row(c, source=True):
+        if c not in rows:
+            rows[c] = len(rows)
+            if isinstance(c, Input):
+                inputs.append(c)
+            elif source:
+                sources.append(c)
+        return rows[c]
+
+    # Inputs first, so that they match the columns of the stimulus
+    for c in board:
+        if isinstance(c, Input):
+            row(c)
+    levels = []
+    functions = {}
+    for level in board.levels():
+        groups = {}
+        for c in level:
+            if not isinstance(c, Gate):
+                row(c)
+                continue
+            drivers = [c.inputs[s] for s in c._symbols]
+            if any(d is None for d in drivers):
+                raise ValueError("{} has an unconnected input".format(c))
+            source = _bitwise_expression(
+                c.expression,
+                {s: "p%d" % i for i, s in enumerate(c._symbols)})
+            groups.setdefault(source, []).append(
+                (row(c, False), [row(d) for d in drivers]))
+        level_groups = []
+        for source, gates in groups.items():
+            if source not in functions:
+                names = "".join(", p%d" % i for i in range(len(gates[0][1])))
+                functions[source] = eval("lambda m%s: %s" % (names, source),
+                                         {})
+            outs = numpy.array([out for out, _ in gates], dtype=numpy.intp)
+            args = [numpy.array(arg, dtype=numpy.intp)
+                    for arg in zip(*(drivers for _, drivers in gates))]
+            level_groups.append((functions[source], outs, args))
+        levels.append(level_groups)
+    outputs = [rows[c] for c in board if isinstance(c, Output)]
+    return (len(rows), inputs,
+            numpy.array([rows[c] for c in sources], dtype=numpy.intp),
+            sources, levels, numpy.array(outputs, dtype=numpy.intp))
+
+
+def simulate_batch(board, inputs, chunk_size=1 << 16):
+    """
+    Simulates many input vectors on a circuit board using NumPy.
+
+    inputs is a bool array of shape (n_vectors, n_inputs) where the columns
+    are the Inputs of the board in the order they are in the board. Returns a
+    bool array of shape (n_vectors, n_outputs) where the columns are the
+    Outputs of the board in order. Other components driving gates keep their
+    current output for every vector. Outputs aren't changed.
+
+    The board is levelised, and 64 vectors are packed into each word so that
+    gates with the same expression in a level are evaluated together with
+    one NumPy operation per operator. chunk_size vectors are simulated at a
+    time to limit memory use. NumPy is only imported when this is called.
+
+    Raises ValueError if a gate has an unconnected input or a component
+    driving it is None, and RecursionError if the gates form a loop.
+    """
+    import numpy
+
+    inputs = numpy.asarray(inputs, dtype=bool)
+    if inputs.ndim != 2:
+        raise ValueError("inputs must be 2 dimensional")
+    cache = board._compiled_cache()
+    if "batch" not in cache:
+        cache["batch"] = _batch_plan(board, numpy)
+    n_rows, input_list, source_rows, sources, levels, outputs = cache["batch"]
+    if inputs.shape[1] != len(input_list):
+        raise ValueError("inputs has {} columns but the board has {} Inputs"
+                         .format(inputs.shape[1], len(input_list)))
+    for c in sources:
+        if c.output is None:
+            raise ValueError("{} is None".format(c))
+
+    n_vectors = inputs.shape[0]
+    result = numpy.zeros((n_vectors, len(outputs)), dtype=bool)
+    mask = numpy.uint64(0xFFFFFFFFFFFFFFFF)
+    source_words = numpy.array([mask if c.output else 0 for c in sources],
+                               dtype=numpy.uint64)
+    chunk_size = max(64, chunk_size - chunk_size % 64)
+    for start in range(0, n_vectors, chunk_size):
+        chunk = inputs[start:start + chunk_size]
+        n = chunk.shape[0]
+        n_words = -(-n // 64)
+        signals = numpy.zeros((n_rows, n_words), dtype=numpy.uint64)
+        # Pack each column into words, vector i being bit i
+        packed = numpy.packbits(chunk.T, axis=1, bitorder="little")
+        padded = numpy.zeros((len(input_list), n_words * 8), dtype=numpy.uint8)
+        padded[:, :packed.shape[1]] = packed
+        signals[:len(input_list)] = padded.view(numpy.uint64)
+        signals[source_rows] = source_words[:, None]
+        for level in levels:
+            for function, outs, args in level:
+                signals[outs] = function(mask, *(signals[a] for a in args))
+        words = numpy.ascontiguousarray(signals[outputs])
+        bits = numpy.unpackbits(words.view(numpy.uint8), axis=1,
+                                bitorder="little")
+        result[start:start + n] = bits[:, :n].T
+    return result
+
+
+# How a component's delay treats pulses. An inertial delay swallows pulses
+# shorter than the delay, while a transport delay passes every change on.
+INERTIAL = "inertial"
+TRANSPORT = "transport"
+
+# Delays used by EventSimulator by default. Components of other classes have
+# no delay.
+DEFAULT_DELAYS = {Gate: 1}
+
+
+class TimingWheel:
+
+    """
+    A queue of events happening at whole number times.
+
+    Events less than size ahead of the current time go straight into the bucket
+    for their time in a circular array, so scheduling them and taking them out
+    again takes constant time. Events further ahead wait in a heap until the
+    wheel has turned far enough to hold them. Events at the same time come out
+    in the order they were scheduled.
+    """
+
+    def __init__(self, size=256):
+        if size < 1:
+            raise ValueError("size must be at least 1 but is {}".format(size))
+        self.now = 0
+        self._size = size
+        self._buckets = [collections.deque() for _ in range(size)]
+        # Number of events in the buckets
+        self._count = 0
+        # Events too far ahead as (time, order scheduled, event)
+        self._overflow = []
+        self._scheduled = 0
+
+    def __len__(self):
+        return self._count + len(self._overflow)
+
+    def schedule(self, time, event):
+        """
+        Schedules an event at time, which must not be before now.
+        """
+        if time < self.now:
+            raise ValueError("Cannot schedule at {} before the current time {}"
+                             .format(time, self.now))
+        if time - self.now < self._size:
+            self._buckets[time % self._size].append(event)
+            self._count += 1
+        else:
+            heapq.heappush(self._overflow, (time, self._scheduled, event))
+            self._scheduled += 1
+
+    def peek(self, until=None):
+        """
+        Turns the wheel to the time of the next event and returns it.
+
+        Returns None if there are no events, or none at or before until, in
+        which case the wheel is not turned past until.
+        """
+        buckets = self._buckets
+        size = self._size
+        overflow = self._overflow
+        while True:
+            while overflow and overflow[0][0] - self.now < size:
+                time, _, event = heapq.heappop(overflow)
+                buckets[time % size].append(event)
+                self._count += 1
+            if not self._count:
+                if not overflow or until is not None and overflow[0][0] > until:
+                    return None
+                self.now = overflow[0][0]
+                continue
+            if buckets[self.now % size]:
+                return self.now
+            if until is not None and self.now >= until:
+                return None
+            self.now += 1
+
+    def pop(self):
+        """
+        Returns the time and the next event, removing it from the wheel.
+        """
+        if self.peek() is None:
+            raise IndexError("pop from an empty timing wheel")
+        self._count -= 1
+        return self.now, self._buckets[self.now % self._size].popleft()
+
+    def advance(self, time):
+        """
+        Moves the current time on to time, which must not be after any event.
+        """
+        if self.peek(time) is not None and self.now < time:
+            raise ValueError("There are events before {}".format(time))
+        self.now = max(self.now, time)
+
+
+class EventSimulator:
+
+    """
+    Simulates a circuit board over time with a delay for each component.
+
+    delays maps component classes to their delays, as a whole number or a tuple
+    of the delay and either INERTIAL or TRANSPORT. Delays are inertial unless
+    given otherwise, and a component uses the entry for the closest of its
+    classes. When an input of a component changes its new output is worked out
+    straight away but only appears after its delay.
+
+    Changes are timed events in a TimingWheel. Each event only updates the
+    components reading the changed output, so the work done depends on the
+    number of changes. monitor is called with the time, component and new
+    output after every change, which shows glitches that evaluating the board
+    would hide.
+
+    The board should not be changed while it is being simulated.
+    """
+
+    def __init__(self, board, delays=None, monitor=None, wheel_size=256):
+        self.board = board
+        self.delays = DEFAULT_DELAYS if delays is None else delays
+        self.monitor = monitor
+        self._wheel = TimingWheel(wheel_size)
+        # Class to (delay, mode)
+        self._class_delays = {}
+        # The last output scheduled for each component and, for inertial
+        # delays, the event that will set it
+        self._projected = {}
+        self._pending = {}
+        for c in dict.fromkeys(board):
+            if not isinstance(c, Input):
+                self._evaluate(c)
+
+    @property
+    def time(self):
+        return self._wheel.now
+
+    def __len__(self):
+        """
+        Returns the number of events waiting to happen.
+        """
+        return len(self._wheel)
+
+    def _delay(self, component):
+        cls = component.__class__
+        if cls not in self._class_delays:
+            delay = (0, INERTIAL)
+            for base in cls.__mro__:
+                if base in self.delays:
+                    delay = self.delays[base]
+                    if not isinstance(delay, tuple):
+                        delay = (delay, INERTIAL)
+                    break
+            if delay[1] not in (INERTIAL, TRANSPORT):
+                raise ValueError("Unknown delay mode {}".format(delay[1]))
+            self._class_delays[cls] = delay
+        return self._class_delays[cls]
+
+    def _evaluate(self, component):
+        """
+        Schedules the change to component's output caused by its inputs.
+        """
+        delay, mode = self._delay(component)
+        time = self._wheel.now + delay
+        if not isinstance(component, Gate):
+            # Only gates can say what their output will be before it changes
+            self._wheel.schedule(time, (component, None))
+            return
+        output = component._compute()
+        if mode == TRANSPORT:
+            if output is not self._projected.get(component, component.output):
+                self._projected[component] = output
+                self._wheel.schedule(time, (component, output))
+            return
+        pending = self._pending.get(component)
+        if pending is not None:
+            if pending[1] is output:
+                return
+            # The pulse is shorter than the delay
+            del self._pending[component]
+        if output is not component.output:
+            event = (component, output)
+            self._pending[component] = event
+            self._wheel.schedule(time, event)
+
+    def set(self, component, output, time=None):
+        """
+        Sets the output of an Input at time, which defaults to now.
+        """
+        if not isinstance(component, Input):
+            raise TypeError("Only Inputs can be set but {} is {}"
+                            .format(component, component.__class__))
+        self._wheel.schedule(self.time if time is None else time,
+                             (component, bool(output)))
+
+    def run(self, until=None, max_events=None):
+        """
+        Carries out events up to and including the time until, or until there
+        are none left if it is None.
+
+        max_events limits the number of events carried out. Returns True if
+        there are no events left, otherwise the next call carries on where this
+        one stopped.
+        """
+        wheel = self._wheel
+        fanout = self.board._index()
+        events = 0
+        while True:
+            time = wheel.peek(until)
+            if time is None or until is not None and time > until:
+                break
+            if max_events is not None and events >= max_events:
+                return False
+            _, event = wheel.pop()
+            events += 1
+            component, output = event
+            before = component.output
+            if isinstance(component, Input):
+                component.output = output
+            elif isinstance(component, Gate):
+                if self._delay(component)[1] == INERTIAL:
+                    if self._pending.get(component) is not event:
+                        # Cancelled by a later change
+                        continue
+                    del self._pending[component]
+                component._output = output
+            else:
+                component.update()
+            if component.output is before:
+                continue
+            if self.monitor is not None:
+                self.monitor(time, component, component.output)
+            for r in fanout.get(component, ()):
+                self._evaluate(r)
+        if until is not None:
+            wheel.advance(until)
+        return not wheel
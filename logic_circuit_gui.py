@@ -812,54 +812,37 @@ def renderable_components(expression, pos=(0, 0), bulb=True):
             .format(expression.__class__))
 
     r = [Bulb(pos)]
-    symbol_dict = {}
-
-    def recursive_components(e):
-        # This function can be used if there is ever the want to attempt to make the
-        # converted logic circuit look nicer by spacing the components
-        def append(r_comp):
-            r.append(r_comp)
-
-        if isinstance(e, boolean.BaseElement):
-            rc = Switch(pos)
-        elif isinstance(e, boolean.Symbol):
-            if e in symbol_dict.keys():
-                return symbol_dict[e]
-            else:
-                rc = Switch(pos)
-                symbol_dict[e] = rc
-        elif isinstance(e, boolean.NOT):
-            pre = recursive_components(e.args[0])
-            w = Wire(pos, pos, pre.component)
+    # Binary trees as the renderable gates only have two inputs
+    nodes, root = logic_circuit.synthesis_plan(expression, 2)
+    rcs = []
+
+    # This function can be used if there is ever the want to attempt to make the
+    # converted logic circuit look nicer by spacing the components
+    def append(r_comp):
+        r.append(r_comp)
+
+    for e, args in nodes:
+        # Each input gets its own wire as wires are drawn
+        ws = [Wire(pos, pos, rcs[i].component) for i in args]
+        for w in ws:
             append(w)
-
-            rc = Not(pos, w.component)
-        elif isinstance(e, boolean.DualBase):
-            if len(e.args) != 2:
-                new_expr = e.__class__(e.args[0], e.args[1])
-                for i in range(2, len(e.args)):
-                    new_expr = e.__class__(new_expr, e.args[i], eval=False)
-                e = new_expr
-            pre0 = recursive_components(e.args[0])
-            pre1 = recursive_components(e.args[1])
-            w0 = Wire(pos, pos, pre0.component)
-            w1 = Wire(pos, pos, pre1.component)
-            append(w0)
-            append(w1)
-
-            if isinstance(e, boolean.AND):
+        if not args:
+            rc = Switch(pos)
+        elif issubclass(e, boolean.NOT):
+            rc = Not(pos, ws[0].component)
+        else:
+            if issubclass(e, boolean.AND):
                 rc = And(pos)
-            elif isinstance(e, boolean.OR):
+            elif issubclass(e, boolean.OR):
                 rc = Or(pos)
             c = rc.component
-            c.inputs[c.empty_input_keys[0]] = w0.component
-            c.inputs[c.empty_input_keys[0]] = w1.component
+            for w in ws:
+                c.inputs[c.empty_input_keys[0]] = w.component
         append(rc)
-        return rc
+        rcs.append(rc)
 
-    recursive_components(expression)
     if bulb:
-        w = Wire(pos, pos, r[-1].component)
+        w = Wire(pos, pos, rcs[root].component)
         r[0].component.input = w.component
         r.append(w)
     else:
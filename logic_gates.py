@@ -54,6 +54,10 @@ LIGHT_BLUE = pygame.color.Color(0, 255, 255, 255)
 # 0 for uncapped fps
 FPS = 0
 
+# Expressions with at most this many symbols are simplified to a minimal sum
+# of products, larger ones are simplified heuristically
+MINIMIZE_SYMBOLS = 10
+
 # This is the pygame surface for the display which everything is drawn on
 surface = pygame.display.set_mode(RESOLUTION, FLAGS)
 pygame.display.set_icon(pygame.image.load("images\\favicon.ico"))
@@ -193,7 +197,11 @@ class BooleanAlgebraContainer(interfaces.IContainer):
                  hidden=False):
         # The buttons is only visable when there is a valid expression
         def func_simplify(func_self, others, keys, events):
-            self.expression = self.expression.eval()
+            if len(self.expression.symbols) <= MINIMIZE_SYMBOLS:
+                self.expression = boolean.minimize(self.expression, "qm")
+            else:
+                self.expression = boolean.minimize(self.expression,
+                                                   "espresso")
             input_expression.text = str(self.expression)
         self.table_expression = text.TruthTable("A",
                                                 (0, 0),
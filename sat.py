@@ -0,0 +1,837 @@
+"""
+Boolean Satisfiability
+
+This module defines a conflict driven clause learning (CDCL) SAT solver and a
+Tseitin encoder which turns the expressions of boolean.py and the components of
+logic_circuit.py into clauses for it. Each subexpression or gate becomes one
+variable and a few clauses, so problems far too big for truth tables or BDDs
+can still be answered.
+
+Literals are written like DIMACS: variables are numbered from 1 and a negative
+literal is the negation of its variable.
+"""
+import heapq
+
+import boolean
+import logic_circuit
+
+
+def _luby(i):
+    """
+    Return the ith (from 0) term of the Luby sequence 1 1 2 1 1 2 4 1 1 2 ...
+    """
+    size, seq = 1, 0
+    while size < i + 1:
+        seq += 1
+        size = 2 * size + 1
+    while size - 1 != i:
+        size = (size - 1) >> 1
+        seq -= 1
+        i %= size
+    return 1 << seq
+
+
+class Solver:
+
+    """
+    A CDCL SAT solver.
+
+    Clauses are watched by two of their literals so only the clauses watching
+    a literal are looked at when it becomes false. Each watch keeps another
+    literal of its clause as a blocker, so satisfied clauses are skipped
+    without being read. Variables are chosen by VSIDS, where the variables in
+    recent conflicts have the highest activity, and take the value they last
+    had. The search restarts after a number of conflicts following the Luby
+    sequence, and learnt clauses with a high literal block distance are
+    thrown away as they build up.
+
+    Internally a literal l is stored as the code 2 * abs(l) + (l < 0), so the
+    negation of a code is code ^ 1.
+
+    Being pure Python it is much slower than a C solver. Two ripple carry
+    adders of about 2,500 gates are proved equivalent in a few seconds and of
+    about 9,000 gates in under a minute. Circuits of tens of thousands of
+    gates are only practical when the problem is easy.
+    """
+
+    restart_base = 100
+    var_decay = 0.95
+
+    def __init__(self):
+        self._nvars = 0
+        # Indexed by code: 1 if the literal is true, -1 if false, else 0.
+        self._value = [0, 0]
+        # Indexed by code: the clauses watching the literal.
+        self._watches = [[], []]
+        # Indexed by var
+        self._level = [0]
+        self._reason = [None]
+        self._activity = [0.0]
+        self._phase = [False]
+        self._seen = [False]
+        self._trail = []
+        self._trail_lim = []
+        self._qhead = 0
+        self._clauses = []
+        # Pairs of literal block distance and clause.
+        self._learnts = []
+        self._max_learnts = 2000
+        self._heap = []
+        # Indexed by var: the activity of its newest entry in the heap, or
+        # None if it has none.
+        self._queued = [None]
+        self._var_inc = 1.0
+        self._ok = True
+        self._model = None
+        self.conflicts = 0
+
+    @property
+    def nvars(self):
+        return self._nvars
+
+    def new_var(self):
+        """
+        Return a new variable.
+        """
+        self._nvars += 1
+        v = self._nvars
+        self._value += [0, 0]
+        self._watches += [[], []]
+        self._level.append(0)
+        self._reason.append(None)
+        self._activity.append(0.0)
+        self._phase.append(False)
+        self._seen.append(False)
+        self._queued.append(0.0)
+        heapq.heappush(self._heap, (0.0, v))
+        return v
+
+    def _code(self, literal):
+        v = abs(literal)
+        if not 0 < v <= self._nvars:
+            raise ValueError("Variable %d does not exist." % v)
+        return 2 * v + (literal < 0)
+
+    def add_clause(self, clause):
+        """
+        Add a clause, which is an iterable of literals.
+
+        Returns False if the clauses are now known to be unsatisfiable.
+        """
+        if not self._ok:
+            return False
+        self._backtrack(0)
+        value = self._value
+        codes = set(self._code(l) for l in clause)
+        if any(code ^ 1 in codes for code in codes):
+            # A tautology
+            return True
+        if any(value[code] == 1 for code in codes):
+            return True
+        codes = [code for code in codes if value[code] == 0]
+        if not codes:
+            self._ok = False
+        elif len(codes) == 1:
+            self._enqueue(codes[0], None)
+            if self._propagate() is not None:
+                self._ok = False
+        else:
+            self._clauses.append(codes)
+            self._watch(codes)
+        return self._ok
+
+    def value(self, literal):
+        """
+        Return the value of a literal in the last model found, or None if the
+        last call to solve didn't find one.
+        """
+        if self._model is None:
+            return None
+        return self._model[abs(literal)] == (literal > 0)
+
+    def _watch(self, clause):
+        """
+        Watch the first two literals of a clause, each blocked by the other.
+        """
+        self._watches[clause[0]].append((clause[1], clause))
+        self._watches[clause[1]].append((clause[0], clause))
+
+    def _enqueue(self, code, reason):
+        value = self._value
+        value[code] = 1
+        value[code ^ 1] = -1
+        v = code >> 1
+        self._level[v] = len(self._trail_lim)
+        self._reason[v] = reason
+        self._trail.append(code)
+
+    def _propagate(self):
+        """
+        Propagate every literal on the trail that hasn't been yet.
+
+        Returns a clause with every literal false if there is a conflict.
+
+        Each watch is a pair of a blocker, another literal of the clause, and
+        the clause. If the blocker is true the clause is satisfied and isn't
+        looked at. The watch list being visited is compacted in place.
+        """
+        value = self._value
+        watches = self._watches
+        trail = self._trail
+        level = self._level
+        reason = self._reason
+        depth = len(self._trail_lim)
+        qhead = self._qhead
+        while qhead < len(trail):
+            false_code = trail[qhead] ^ 1
+            qhead += 1
+            ws = watches[false_code]
+            n = len(ws)
+            i = j = 0
+            while i < n:
+                watch = ws[i]
+                i += 1
+                blocker = watch[0]
+                if value[blocker] == 1:
+                    ws[j] = watch
+                    j += 1
+                    continue
+                clause = watch[1]
+                if len(clause) == 2:
+                    # The blocker of a binary clause is its other literal
+                    ws[j] = watch
+                    j += 1
+                    if value[blocker] == -1:
+                        ws[j:i] = []
+                        self._qhead = len(trail)
+                        return clause
+                    if clause[0] != blocker:
+                        clause[0] = blocker
+                        clause[1] = false_code
+                    value[blocker] = 1
+                    value[blocker ^ 1] = -1
+                    v = blocker >> 1
+                    level[v] = depth
+                    reason[v] = clause
+                    trail.append(blocker)
+                    continue
+                # Make sure the false literal is the second one
+                first = clause[0]
+                if first == false_code:
+                    first = clause[0] = clause[1]
+                    clause[1] = false_code
+                if first != blocker and value[first] == 1:
+                    ws[j] = (first, clause)
+                    j += 1
+                    continue
+                # Look for a new literal to watch
+                for k in range(2, len(clause)):
+                    code = clause[k]
+                    if value[code] != -1:
+                        clause[1] = code
+                        clause[k] = false_code
+                        watches[code].append((first, clause))
+                        break
+                else:
+                    ws[j] = watch if first == blocker else (first, clause)
+                    j += 1
+                    if value[first] == -1:
+                        ws[j:i] = []
+                        self._qhead = len(trail)
+                        return clause
+                    # Unit, so the first literal is implied by the clause
+                    value[first] = 1
+                    value[first ^ 1] = -1
+                    v = first >> 1
+                    level[v] = depth
+                    reason[v] = clause
+                    trail.append(first)
+            del ws[j:]
+        self._qhead = qhead
+        return None
+
+    def _bump(self, v):
+        activity = self._activity
+        activity[v] += self._var_inc
+        if activity[v] > 1e100:
+            for i in range(1, self._nvars + 1):
+                activity[i] *= 1e-100
+            self._var_inc *= 1e-100
+            self._rebuild_heap()
+        else:
+            self._queued[v] = activity[v]
+            heapq.heappush(self._heap, (-activity[v], v))
+
+    def _rebuild_heap(self):
+        value = self._value
+        activity = self._activity
+        queued = self._queued
+        self._heap = []
+        for v in range(1, self._nvars + 1):
+            if value[2 * v] == 0:
+                queued[v] = activity[v]
+                self._heap.append((-activity[v], v))
+            else:
+                queued[v] = None
+        heapq.heapify(self._heap)
+
+    def _analyze(self, conflict):
+        """
+        Return the first UIP clause learnt from a conflict, with the asserting
+        literal first, and the level to go back to.
+        """
+        seen = self._seen
+        level = self._level
+        reason = self._reason
+        trail = self._trail
+        depth = len(self._trail_lim)
+        learnt = [None]
+        cleanup = []
+        counter = 0
+        index = len(trail) - 1
+        clause = conflict
+        start = 0
+        while True:
+            for code in clause[start:]:
+                v = code >> 1
+                if not seen[v] and level[v] > 0:
+                    seen[v] = True
+                    cleanup.append(v)
+                    self._bump(v)
+                    if level[v] >= depth:
+                        counter += 1
+                    else:
+                        learnt.append(code)
+            while not seen[trail[index] >> 1]:
+                index -= 1
+            code = trail[index]
+            index -= 1
+            v = code >> 1
+            clause = reason[v]
+            seen[v] = False
+            counter -= 1
+            if counter == 0:
+                break
+            # The first literal of a reason is the one it implied
+            start = 1
+        learnt[0] = code ^ 1
+
+        # Remove literals implied by the other literals of the clause
+        minimized = [learnt[0]]
+        for code in learnt[1:]:
+            r = reason[code >> 1]
+            if r is None or any(not seen[c >> 1] and level[c >> 1] > 0
+                                for c in r[1:]):
+                minimized.append(code)
+        for v in cleanup:
+            seen[v] = False
+
+        back = 0
+        if len(minimized) > 1:
+            best = max(range(1, len(minimized)),
+                       key=lambda i: level[minimized[i] >> 1])
+            minimized[1], minimized[best] = minimized[best], minimized[1]
+            back = level[minimized[1] >> 1]
+        return minimized, back
+
+    def _backtrack(self, depth):
+        if len(self._trail_lim) <= depth:
+            return
+        value = self._value
+        reason = self._reason
+        phase = self._phase
+        activity = self._activity
+        queued = self._queued
+        heap = self._heap
+        start = self._trail_lim[depth]
+        for code in self._trail[start:]:
+            v = code >> 1
+            value[code] = value[code ^ 1] = 0
+            reason[v] = None
+            phase[v] = not code & 1
+            if queued[v] != activity[v]:
+                queued[v] = activity[v]
+                heapq.heappush(heap, (-activity[v], v))
+        del self._trail[start:]
+        del self._trail_lim[depth:]
+        self._qhead = start
+
+    def _decide(self):
+        """
+        Return the unassigned variable with the highest activity, or None.
+        """
+        heap = self._heap
+        if len(heap) > 4 * self._nvars + 1000:
+            self._rebuild_heap()
+        value = self._value
+        activity = self._activity
+        queued = self._queued
+        while heap:
+            a, v = heapq.heappop(heap)
+            if -a == activity[v] == queued[v]:
+                queued[v] = None
+                if value[2 * v] == 0:
+                    return v
+        return None
+
+    def _reduce(self):
+        """
+        Throw away half of the learnt clauses with the highest literal block
+        distance, remove satisfied clauses and false literals, and rewatch.
+
+        This must be called at level 0 after propagating.
+        """
+        self._learnts.sort(key=lambda p: (p[0], len(p[1])))
+        keep = len(self._learnts) // 2
+        self._learnts = [p for i, p in enumerate(self._learnts)
+                         if i < keep or p[0] <= 2]
+        value = self._value
+
+        def simplify(clause):
+            if any(value[code] == 1 for code in clause):
+                return None
+            return [code for code in clause if value[code] == 0]
+
+        clauses = []
+        for clause in self._clauses:
+            clause = simplify(clause)
+            if clause is not None:
+                clauses.append(clause)
+        self._clauses = clauses
+        learnts = []
+        for lbd, clause in self._learnts:
+            clause = simplify(clause)
+            if clause is not None:
+                learnts.append((lbd, clause))
+        self._learnts = learnts
+
+        self._watches = [[] for _ in range(2 * self._nvars + 2)]
+        for clause in self._clauses:
+            self._watch(clause)
+        for _, clause in self._learnts:
+            self._watch(clause)
+        self._max_learnts = int(self._max_learnts * 1.1)
+
+    def _search(self, limit, assumptions):
+        """
+        Search until a model is found (True), the clauses are unsatisfiable
+        under the assumptions (False) or there have been limit conflicts
+        (None).
+        """
+        level = self._level
+        value = self._value
+        phase = self._phase
+        trail_lim = self._trail_lim
+        conflicts = 0
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                conflicts += 1
+                self.conflicts += 1
+                if not trail_lim:
+                    self._ok = False
+                    return False
+                learnt, back = self._analyze(conflict)
+                self._backtrack(back)
+                if len(learnt) == 1:
+                    self._enqueue(learnt[0], None)
+                else:
+                    lbd = len(set(level[code >> 1] for code in learnt))
+                    self._learnts.append((lbd, learnt))
+                    self._watch(learnt)
+                    self._enqueue(learnt[0], learnt)
+                self._var_inc /= self.var_decay
+                continue
+
+            if conflicts >= limit:
+                self._backtrack(0)
+                if len(self._learnts) > self._max_learnts:
+                    if self._propagate() is not None:
+                        self._ok = False
+                        return False
+                    self._reduce()
+                return None
+
+            depth = len(trail_lim)
+            if depth < len(assumptions):
+                code = assumptions[depth]
+                if value[code] == 1:
+                    # Already true, so the level has no decision
+                    trail_lim.append(len(self._trail))
+                    continue
+                if value[code] == -1:
+                    return False
+            else:
+                v = self._decide()
+                if v is None:
+                    return True
+                code = 2 * v + (not phase[v])
+            trail_lim.append(len(self._trail))
+            self._enqueue(code, None)
+
+    def solve(self, assumptions=()):
+        """
+        Return True if the clauses are satisfiable with every literal in
+        assumptions true, otherwise False.
+
+        If True, value gives the model that was found.
+        """
+        self._model = None
+        if not self._ok:
+            return False
+        assumptions = [self._code(l) for l in assumptions]
+        self._backtrack(0)
+        restarts = 0
+        while True:
+            status = self._search(self.restart_base * _luby(restarts),
+                                  assumptions)
+            if status is not None:
+                break
+            restarts += 1
+        if status:
+            value = self._value
+            self._model = [False] + [value[2 * v] == 1
+                                     for v in range(1, self._nvars + 1)]
+        self._backtrack(0)
+        return status
+
+
+# The polarities a subexpression is used in
+POSITIVE = 1
+NEGATIVE = 2
+BOTH = 3
+
+
+class Encoder:
+
+    """
+    A Tseitin encoder from expressions and circuit components to clauses.
+
+    Every AND and OR gets a new variable which is equal to it, so the number
+    of clauses grows linearly with the size of the expression instead of
+    exponentially like with normalize. NOT is just a negative literal.
+    Equal subexpressions and components share the same literal, so encoding
+    several expressions into the same encoder lets the solver compare them.
+
+    If plaisted_greenbaum is True, a subexpression only used positively (or
+    negatively) only gets the clauses for that direction of the equality,
+    which is about half of them. Expressions added with add are only used
+    positively, while the literals returned by expression can be used either
+    way. Gates are always encoded in full as circuits may have loops.
+
+    The clauses are added to solver, which can be anything with new_var and
+    add_clause methods like Solver or DimacsWriter.
+    """
+
+    def __init__(self, solver=None, plaisted_greenbaum=False):
+        self.solver = Solver() if solver is None else solver
+        self.plaisted_greenbaum = plaisted_greenbaum
+        # Maps symbols and Input components to variables
+        self.variables = {}
+        self._expressions = {}
+        # Maps subexpressions to the polarities they have clauses for
+        self._polarities = {}
+        self._components = {}
+        self._true = None
+
+    def _true_literal(self):
+        if self._true is None:
+            self._true = self.solver.new_var()
+            self.solver.add_clause((self._true,))
+        return self._true
+
+    def variable(self, key):
+        """
+        Return the variable of a symbol or Input component.
+        """
+        v = self.variables.get(key)
+        if v is None:
+            v = self.variables[key] = self.solver.new_var()
+        return v
+
+    def expression(self, expr, symbols=None, polarity=BOTH):
+        """
+        Return a literal equal to an expression, which may be a string or
+        Expression.
+
+        symbols can map symbols to literals to use instead of their variable.
+        polarity says how the literal will be used, and only matters when
+        plaisted_greenbaum is True.
+        """
+        if isinstance(expr, str):
+            expr = boolean.parse(expr, eval=False)
+        if not isinstance(expr, boolean.Expression):
+            raise TypeError("Argument must be str or Expression but it is %s"
+                            % expr.__class__)
+        if not self.plaisted_greenbaum:
+            polarity = BOTH
+        solver = self.solver
+        ops = expr.algebra.operations
+        # Literals depend on symbols, so they can only be shared if it's empty
+        if symbols:
+            literals, done = {}, {}
+        else:
+            literals, done = self._expressions, self._polarities
+
+        # Subexpressions with children first
+        order = []
+        seen = set()
+        stack = [(expr, False)]
+        while stack:
+            e, expanded = stack.pop()
+            if expanded:
+                order.append(e)
+            elif e not in seen:
+                seen.add(e)
+                stack.append((e, True))
+                if isinstance(e, boolean.Function) and done.get(e) != BOTH:
+                    stack.extend((arg, False) for arg in e.args)
+
+        # Push the polarities that don't have clauses yet down to the children
+        needed = {expr: polarity}
+        for e in reversed(order):
+            p = needed.get(e, 0) & ~done.get(e, 0)
+            if p and isinstance(e, boolean.Function):
+                if isinstance(e, ops.NOT):
+                    p = (p & POSITIVE) << 1 | (p & NEGATIVE) >> 1
+                for arg in e.args:
+                    needed[arg] = needed.get(arg, 0) | p
+
+        for e in order:
+            if e not in literals:
+                if isinstance(e, boolean.BaseElement):
+                    literals[e] = self._true_literal() if e else \
+                        -self._true_literal()
+                elif isinstance(e, boolean.Symbol):
+                    if symbols and e in symbols:
+                        literals[e] = symbols[e]
+                    else:
+                        literals[e] = self.variable(e)
+                elif isinstance(e, ops.NOT):
+                    literals[e] = -literals[e.args[0]]
+                elif isinstance(e, (ops.AND, ops.OR)):
+                    literals[e] = solver.new_var()
+                else:
+                    raise TypeError("Can't encode %s."
+                                    % e.__class__.__name__)
+            if not isinstance(e, (ops.AND, ops.OR)):
+                continue
+            p = needed.get(e, 0) & ~done.get(e, 0)
+            if not p:
+                continue
+            done[e] = done.get(e, 0) | p
+            t = literals[e]
+            args = [literals[arg] for arg in e.args]
+            # An OR is an AND with every literal negated
+            if isinstance(e, ops.AND):
+                sign = 1
+            else:
+                sign = -1
+                p = (p & POSITIVE) << 1 | (p & NEGATIVE) >> 1
+            if p & POSITIVE:
+                for a in args:
+                    solver.add_clause((-sign * t, sign * a))
+            if p & NEGATIVE:
+                solver.add_clause([sign * t] + [-sign * a for a in args])
+        return literals[expr]
+
+    def add(self, value):
+        """
+        Add the constraint that an expression, string or the output of a
+        component is TRUE.
+
+        A circuit board adds every component, with its outputs TRUE.
+        """
+        if isinstance(value, logic_circuit.CircuitBoard):
+            literals = self.circuit_board(value)
+            for c, literal in literals.items():
+                if isinstance(c, logic_circuit.Output):
+                    self.solver.add_clause((literal,))
+        elif isinstance(value, logic_circuit.Component):
+            self.solver.add_clause((self.component(value),))
+        else:
+            self.solver.add_clause((self.expression(value,
+                                                    polarity=POSITIVE),))
+
+    def component(self, component):
+        """
+        Return a literal equal to the output of a component.
+
+        Inputs are free variables, as are unconnected inputs of gates. Every
+        gate feeding the component is encoded, and loops are allowed.
+
+        Gates are encoded after the components feeding them, so the literal
+        of a gate's expression is used as its literal and wires cost nothing.
+        Only a gate closing a loop gets a variable of its own before its
+        inputs are known.
+        """
+        solver = self.solver
+        literals = self._components
+        # Gates whose inputs are being encoded
+        open_gates = set()
+        stack = [(component, False)]
+        while stack:
+            c, expanded = stack.pop()
+            if expanded:
+                open_gates.discard(c)
+                symbols = {s: literals[v] if v is not None
+                           else solver.new_var()
+                           for s, v in c.inputs.items()}
+                literal = self.expression(c.expression, symbols)
+                out = literals.get(c)
+                if out is None:
+                    literals[c] = literal
+                elif out != literal:
+                    solver.add_clause((-out, literal))
+                    solver.add_clause((out, -literal))
+            elif c in literals:
+                continue
+            elif c in open_gates:
+                # A loop
+                literals[c] = solver.new_var()
+            elif isinstance(c, logic_circuit.Input):
+                literals[c] = self.variable(c)
+            elif isinstance(c, logic_circuit.Gate):
+                open_gates.add(c)
+                stack.append((c, True))
+                stack.extend((v, False) for v in c.inputs.values()
+                             if v is not None)
+            else:
+                literals[c] = solver.new_var()
+        return literals[component]
+
+    def circuit_board(self, board):
+        """
+        Encode every component of a circuit board and return a dictionary
+        mapping them to their literals.
+        """
+        return {c: self.component(c) for c in board}
+
+    def encode(self, value):
+        """
+        Return a literal for an expression, string or component.
+        """
+        if isinstance(value, logic_circuit.Component):
+            return self.component(value)
+        return self.expression(value)
+
+
+def satisfiable(value):
+    """
+    Return an assignment for which an expression or the output of a component
+    is TRUE, or None if there is none.
+
+    For expressions, the assignment maps symbols to TRUE or FALSE. For
+    components, it maps the Input components feeding it to True or False.
+    """
+    encoder = Encoder(plaisted_greenbaum=True)
+    encoder.add(value)
+    solver = encoder.solver
+    if not solver.solve():
+        return None
+    if isinstance(value, logic_circuit.Component):
+        return {k: solver.value(v) for k, v in encoder.variables.items()}
+    return {k: boolean.TRUE if solver.value(v) else boolean.FALSE
+            for k, v in encoder.variables.items()}
+
+
+def equivalent(value1, value2):
+    """
+    Return True if two expressions or the outputs of two components are equal
+    for every assignment.
+
+    Symbols are matched by equality and Input components by identity.
+    """
+    encoder = Encoder()
+    literal1 = encoder.encode(value1)
+    literal2 = encoder.encode(value2)
+    if literal1 == literal2:
+        return True
+    # Look for an assignment where they differ
+    solver = encoder.solver
+    solver.add_clause((literal1, literal2))
+    solver.add_clause((-literal1, -literal2))
+    return not solver.solve()
+
+
+class DimacsWriter:
+
+    """
+    Writes clauses to a file object in DIMACS format as they are added.
+
+    This can be used instead of a Solver by an Encoder. Nothing is kept in
+    memory apart from the number of variables and clauses. If file is None
+    they are only counted.
+    """
+
+    def __init__(self, file=None):
+        self.file = file
+        self.nvars = 0
+        self.nclauses = 0
+
+    def new_var(self):
+        self.nvars += 1
+        return self.nvars
+
+    def add_clause(self, clause):
+        self.nclauses += 1
+        if self.file is not None:
+            self.file.write(" ".join(str(l) for l in clause) + " 0\n")
+        return True
+
+
+def write_dimacs(file, *values, plaisted_greenbaum=True):
+    """
+    Write the constraints that every value is TRUE to a file object in DIMACS
+    format, and return a dictionary mapping symbols and Input components to
+    their variables.
+
+    Values can be expressions, strings, components or circuit boards, like
+    Encoder.add. The header of a DIMACS file needs the number of variables and
+    clauses, so the values are encoded twice: once to count them and once to
+    write them. Clauses are never all held in memory. The name of each symbol
+    and Input component is written in a comment before the header.
+    """
+    def encode(writer):
+        encoder = Encoder(writer, plaisted_greenbaum)
+        for value in values:
+            encoder.add(value)
+        return encoder
+
+    counter = encode(DimacsWriter())
+    variables = counter.variables
+    for key, v in variables.items():
+        file.write("c %d %s\n" % (v, key if isinstance(key, boolean.Symbol)
+                                   else key.__class__.__name__))
+    file.write("p cnf %d %d\n" % (counter.solver.nvars,
+                                   counter.solver.nclauses))
+    encode(DimacsWriter(file))
+    return variables
+
+
+def read_dimacs(file, solver=None):
+    """
+    Add the clauses in a DIMACS file object to a solver, one line at a time,
+    and return the solver.
+
+    A new Solver is used if one isn't given.
+    """
+    if solver is None:
+        solver = Solver()
+    clause = []
+    for line in file:
+        line = line.strip()
+        if not line or line[0] in "cp%":
+            continue
+        for token in line.split():
+            literal = int(token)
+            if literal == 0:
+                solver.add_clause(clause)
+                clause = []
+                continue
+            while solver.nvars < abs(literal):
+                solver.new_var()
+            clause.append(literal)
+    if clause:
+        solver.add_clause(clause)
+    return solver
@@ -0,0 +1,206 @@
+import sys
+sys.path.append("..")
+
+import random
+import unittest
+import boolean
+import bdd
+import logic_circuit as lc
+
+
+def random_expression(symbols, depth):
+    if depth == 0 or random.random() < 0.2:
+        symbol = random.choice(symbols)
+        return symbol if random.random() < 0.5 else ~symbol
+    op = random.choice((boolean.AND, boolean.OR))
+    args = [random_expression(symbols, depth - 1)
+            for _ in range(random.randint(2, 3))]
+    expr = op(*args, eval=False)
+    return ~expr if random.random() < 0.2 else expr
+
+
+def column(expr, symbols):
+    return boolean.truth_table_columns(expr, symbols)[1][expr]
+
+
+class BDDTestCase(unittest.TestCase):
+
+    def test_canonical(self):
+        manager = bdd.BDD()
+        a, b, c = boolean.symbols("a", "b", "c")
+        f = manager.from_expression(a * (b + c))
+        g = manager.from_expression((a * c) + (b * a))
+        self.assertTrue(f is g)
+        self.assertTrue(manager.from_expression(a + ~a) is manager.true)
+        self.assertTrue(manager.from_expression(a * ~a) is manager.false)
+        self.assertTrue(manager.var(a) is manager.from_expression("a"))
+        self.assertEqual(manager.symbols, (a, b, c))
+        self.assertEqual(manager.size(f), 5)
+
+    def test_order(self):
+        a, b, c = boolean.symbols("a", "b", "c")
+        manager = bdd.BDD((c, b))
+        manager.from_expression(a * b * c)
+        self.assertEqual(manager.symbols, (c, b, a))
+        self.assertRaises(TypeError, manager.add_symbol, "a")
+        self.assertRaises(TypeError, manager.from_expression, 1)
+
+    def test_conversion(self):
+        random.seed(7)
+        symbols = boolean.symbols(*"abcde")
+        for _ in range(30):
+            expr = random_expression(symbols, 4)
+            manager = bdd.BDD(symbols)
+            f = manager.from_expression(expr)
+            back = manager.to_expression(f)
+            self.assertEqual(column(expr, symbols),
+                             column(back, symbols))
+            self.assertTrue(manager.from_expression(back) is f)
+            self.assertEqual(manager.count(f),
+                             bin(column(expr, symbols)).count("1"))
+
+    def test_satisfy(self):
+        manager = bdd.BDD()
+        a, b, c = boolean.symbols("a", "b", "c")
+        f = manager.from_expression(a * ~b + c * b)
+        assignment = manager.satisfy(f)
+        self.assertTrue((a * ~b + c * b).subs(assignment) is boolean.TRUE)
+        self.assertTrue(manager.satisfy(manager.false) is None)
+        self.assertEqual(manager.satisfy(manager.true), {})
+
+    def test_cache(self):
+        manager = bdd.BDD(cache_size=4)
+        expr = boolean.parse("(a+b)*(c+d)*(e+f)*(g+h)")
+        f = manager.from_expression(expr)
+        self.assertTrue(len(manager._cache) <= 4)
+        self.assertEqual(manager.count(f), 81)
+        manager.clear_cache()
+        self.assertEqual(len(manager._cache), 0)
+        self.assertTrue(manager.from_expression(expr) is f)
+
+    def test_collect(self):
+        manager = bdd.BDD(cache_size=0)
+        f = manager.from_expression("a*b+c*d")
+        size = len(manager)
+        self.assertEqual(size, manager.size(f) - 2)
+        del f
+        self.assertTrue(len(manager) < size)
+
+    def test_functions(self):
+        self.assertTrue(bdd.equivalent("~(a*b)", "~a+~b"))
+        self.assertFalse(bdd.equivalent("a*b", "a+b"))
+        self.assertTrue(bdd.is_tautology("a*b+~a+~b"))
+        self.assertFalse(bdd.is_tautology("a+b"))
+        self.assertEqual(bdd.count("a+b"), 3)
+        self.assertEqual(bdd.count("a*b*c"), 1)
+
+    def test_wide(self):
+        # Far too many symbols for a truth table.
+        n = 64
+        xs = boolean.symbols(*("x%d" % i for i in range(n)))
+        ys = boolean.symbols(*("y%d" % i for i in range(n)))
+        order = [s for pair in zip(xs, ys) for s in pair]
+        manager = bdd.BDD(order)
+        expr = boolean.AND(*(x * y + ~x * ~y for x, y in zip(xs, ys)))
+        f = manager.from_expression(expr)
+        self.assertEqual(manager.count(f), 2 ** n)
+        self.assertEqual(manager.size(f), 3 * n + 2)
+
+    def test_deep(self):
+        # Many more levels than the recursion limit
+        n = 2 * sys.getrecursionlimit() + 100
+        xs = boolean.symbols(*("x%d" % i for i in range(n)))
+        manager = bdd.BDD(xs)
+        f = manager.from_expression(boolean.AND(*xs))
+        self.assertEqual(manager.size(f), n + 2)
+        self.assertEqual(manager.count(f), 1)
+        g = manager.from_expression(boolean.OR(*xs))
+        self.assertTrue(manager.apply_and(f, g) is f)
+        self.assertTrue(manager.apply_or(f, g) is g)
+        parity = manager.false
+        for x in xs[:50]:
+            parity = manager.ite(manager.var(x), manager.apply_not(parity),
+                                 parity)
+        self.assertEqual(manager.count(parity), 2 ** (n - 1))
+        self.assertTrue(manager.ite(f, g, manager.apply_not(g)) is
+                        manager.apply_not(manager.apply_and(
+                            manager.apply_not(f), g)))
+
+
+class ReorderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # Sorted by name, the a's all come before the b's which is the worst
+        # order for this function.
+        self.n = 8
+        self.expr = boolean.OR(*(boolean.parse("a%d*b%d" % (i, i))
+                                 for i in range(self.n)))
+
+    def test_swap(self):
+        random.seed(3)
+        symbols = boolean.symbols(*"abcde")
+        manager = bdd.BDD(symbols)
+        exprs = [random_expression(symbols, 4)
+                 for _ in range(10)]
+        fs = [manager.from_expression(expr) for expr in exprs]
+        for _ in range(20):
+            manager.swap(random.randrange(len(symbols) - 1))
+        self.assertNotEqual(manager.symbols, symbols)
+        for expr, f in zip(exprs, fs):
+            back = manager.to_expression(f)
+            self.assertEqual(column(back, symbols), column(expr, symbols))
+            self.assertTrue(manager.from_expression(expr) is f)
+            for node in manager.nodes(f):
+                if node.var is not None:
+                    self.assertTrue(manager.level(node.low) >
+                                    manager.level(node))
+                    self.assertTrue(manager.level(node.high) >
+                                    manager.level(node))
+
+    def test_reorder(self):
+        manager = bdd.BDD()
+        f = manager.from_expression(self.expr)
+        count = manager.count(f)
+        before = len(manager)
+        self.assertTrue(before > 2 ** self.n)
+        after = manager.reorder()
+        self.assertEqual(after, len(manager))
+        self.assertEqual(after, 2 * self.n)
+        self.assertEqual(manager.count(f), count)
+        self.assertTrue(manager.from_expression(self.expr) is f)
+
+    def test_time_limit(self):
+        manager = bdd.BDD()
+        manager.from_expression(self.expr)
+        symbols = manager.symbols
+        manager.reorder(time_limit=-1)
+        self.assertEqual(manager.symbols, symbols)
+
+    def test_automatic(self):
+        manager = bdd.BDD(reorder_threshold=64)
+        f = manager.from_expression(self.expr)
+        self.assertTrue(len(manager) < 64)
+        self.assertTrue(manager.from_expression(self.expr) is f)
+        self.assertEqual(manager.count(f), bdd.count(self.expr))
+
+    def test_adder(self):
+        # The carry out of a ripple carry adder built from gates.
+        n = 6
+        carry = lc.Switch()
+        a = [lc.Switch() for _ in range(n)]
+        b = [lc.Switch() for _ in range(n)]
+        for x, y in zip(a, b):
+            carry = lc.Or((lc.And((x, y)), lc.And((carry, lc.Or((x, y))))))
+        expr = lc.expression(carry)
+        # Split up the bits of each pair, which are named one after the other
+        symbols = sorted(expr.symbols, key=str)
+        manager = bdd.BDD(symbols[0::2] + symbols[1::2])
+        f = manager.from_expression(expr)
+        before = manager.size(f)
+        manager.reorder()
+        self.assertTrue(manager.size(f) < before)
+        self.assertTrue(manager.from_expression(expr) is f)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import sys
 sys.path.append("..")
 
+import itertools
 import unittest
 import boolean
 
@@ -297,6 +298,26 @@ class DualBaseTestCase(unittest.TestCase):
                              "(a*~b*~c*d) + (~a*b*c*d) + (a*~b*c*d) + (a*b*c*d)")
         # TODO: Test the last expr in DualBaseTestCase.test_eval.
 
+    def test_eval_wide(self):
+        # Every row of an 8 symbol truth table eliminates down to nothing
+        symbols = boolean.symbols(*("x%d" % i for i in range(8)))
+        terms = [boolean.AND(*(s if row >> i & 1 else ~s
+                               for i, s in enumerate(symbols)), eval=False)
+                 for row in range(1 << len(symbols))]
+        self.assertTrue(boolean.OR(*terms) is boolean.TRUE)
+        # Without the first row only a term per symbol is left
+        expr = boolean.OR(*terms[1:])
+        self.assertEqual(expr, boolean.OR(*symbols))
+        # Absorption and negative absorption between many terms
+        a = self.a
+        expr = boolean.OR(a, *(~a * s for s in symbols))
+        self.assertEqual(expr, boolean.OR(a, *symbols))
+        expr = boolean.OR(a * symbols[0], *(a * s * t for s in symbols
+                                            for t in symbols[1:]))
+        self.assertEqual(expr, boolean.parse("a*x0") +
+                         boolean.AND(a, boolean.OR(*symbols[1:])).
+                         distributive())
+
     def test_flatten(self):
         p = lambda x: boolean.parse(x, eval=False)
         a = self.a
@@ -421,6 +442,51 @@ class OtherTestCase(unittest.TestCase):
         self.assertEqual(expr.subs({a: b + c}), boolean.parse("(b+c)*b+c"))
         self.assertEqual(expr.subs({a * b: a}), a + c)
         self.assertEqual(expr.subs({c: boolean.TRUE}), boolean.TRUE)
+        self.assertEqual(a.subs({b: c}), a)
+        self.assertEqual(a.subs({a: c}), c)
+        # Substitutions are simultaneous
+        self.assertEqual(expr.subs({a: b, b: a}), expr)
+
+    def test_subs_shared(self):
+        # Without sharing there would be 2^200 paths through the expression
+        n = 200
+        xs = boolean.symbols(*("x%d" % i for i in range(n)))
+        ys = boolean.symbols(*("y%d" % i for i in range(n)))
+        expr = xs[0]
+        for x in xs[1:]:
+            # Both sides share the previous expression
+            expr = boolean.OR(boolean.AND(expr, x, eval=False),
+                              boolean.AND(expr, ~x, eval=False), eval=False)
+        renamed = expr.subs(dict(zip(xs, ys)), eval=False)
+        self.assertEqual(renamed.symbols, set(ys))
+        self.assertTrue(renamed.args[0].args[0] is renamed.args[1].args[0])
+        self.assertTrue(expr.subs({}) is expr)
+
+    def test_subs_deep(self):
+        # Far deeper than the recursion limit
+        a, b, c = boolean.symbols("a", "b", "c")
+        expr = a
+        for _ in range(3 * sys.getrecursionlimit()):
+            expr = boolean.NOT(boolean.AND(expr, c, eval=False), eval=False)
+        renamed = expr.subs({a: b}, eval=False)
+        self.assertEqual(renamed.symbols, {b, c})
+        self.assertEqual(expr.symbols, {a, c})
+
+    def test_symbol_sets(self):
+        a, b, c = boolean.symbols("a", "b", "c")
+        expr = boolean.parse("a*~b+~(a+c)", eval=False)
+        self.assertEqual(expr.symbols, {a, b, c})
+        self.assertEqual(expr.literals, {a, ~b, c})
+        self.assertEqual(expr.objects, {"a", "b", "c"})
+        self.assertIsInstance(expr.symbols, frozenset)
+        self.assertTrue(expr.symbols is expr.symbols)
+        self.assertTrue(expr.literals is expr.literals)
+        self.assertEqual(boolean.TRUE.symbols, set())
+        # Far deeper than the recursion limit
+        for i in range(2 * sys.getrecursionlimit()):
+            expr = boolean.AND(expr, boolean.Symbol(i % 10), eval=False)
+        self.assertEqual(len(expr.symbols), 13)
+        self.assertEqual(len(expr.objects), 13)
 
     def test_normalize(self):
         parse = boolean.parse
@@ -430,6 +496,101 @@ class OtherTestCase(unittest.TestCase):
         self.assertTrue(result == sol)
 
 
+class MinimizeTestCase(unittest.TestCase):
+
+    def assertEquivalent(self, expr1, expr2):
+        symbols, columns1 = boolean.truth_table_columns(expr1)
+        symbols, columns2 = boolean.truth_table_columns(expr2, symbols)
+        self.assertEqual(columns1[expr1], columns2[expr2])
+
+    def test_qm(self):
+        parse = boolean.parse
+        minimize = boolean.minimize
+        self.assertEqual(minimize("a*~a"), boolean.FALSE)
+        self.assertEqual(minimize("a+~a"), boolean.TRUE)
+        self.assertEqual(minimize("a*(a+b)"), parse("a"))
+        self.assertEqual(minimize("(~a*b*c) + (a*~b*c) + (a*b*~c) + (a*b*c)"),
+                         parse("(a*b)+(b*c)+(a*c)"))
+        # Consensus: b*c is redundant
+        self.assertEqual(minimize("(a*b)+(~a*c)+(b*c)"),
+                         parse("(a*b)+(~a*c)"))
+        self.assertRaises(ValueError, minimize, "a", "unknown")
+        self.assertRaises(TypeError, minimize, None)
+
+    def test_qm_random(self):
+        import random
+        rng = random.Random(0)
+        names = ["x%s" % i for i in range(6)]
+        for _ in range(30):
+            terms = ["*".join(rng.choice((n, "~" + n))
+                              for n in rng.sample(names, rng.randint(1, 6)))
+                     for _ in range(rng.randint(1, 8))]
+            expr = boolean.parse("+".join(terms), eval=False)
+            result = boolean.minimize(expr)
+            self.assertEquivalent(expr, result)
+            # No product term can be removed
+            if isinstance(result, boolean.OR):
+                symbols, columns = boolean.truth_table_columns(expr)
+                for arg in result.args:
+                    reduced = result.remove(arg, eval=False)
+                    self.assertNotEqual(
+                        boolean.truth_table_columns(reduced, symbols)[1][reduced],
+                        columns[expr])
+
+    def test_qm_dense(self):
+        # A random table has no structure to reduce the search, which stops
+        # after QM_SEARCH_NODES branches or QM_TIME_LIMIT seconds instead of
+        # running for hours.
+        import random
+        rng = random.Random(2)
+        symbols = boolean.symbols(*("x%s" % i for i in range(9)))
+        terms = [boolean.AND(*(s if row >> i & 1 else ~s
+                               for i, s in enumerate(symbols)), eval=False)
+                 for row in range(1 << len(symbols)) if rng.random() < 0.5]
+        expr = boolean.OR(*terms, eval=False)
+        result = boolean.minimize(expr)
+        self.assertEquivalent(expr, result)
+        self.assertTrue(len(result.args) < len(terms))
+        # Without any time to search the greedy cover is returned
+        column = boolean.truth_table_columns(expr, symbols)[1][expr]
+        cubes = boolean._qm_cover(column, len(symbols), time_limit=0)
+        self.assertEquivalent(expr, boolean._sum_of_products(
+            cubes, symbols, expr.algebra))
+
+    def test_espresso(self):
+        import random
+        rng = random.Random(1)
+        names = ["x%s" % i for i in range(7)]
+        for _ in range(40):
+            terms = ["*".join(rng.choice((n, "~" + n))
+                              for n in rng.sample(names, rng.randint(1, 7)))
+                     for _ in range(rng.randint(1, 8))]
+            expr = boolean.parse("+".join(terms), eval=False)
+            if rng.random() < 0.3:
+                expr = ~expr
+            self.assertEquivalent(expr, boolean.minimize(expr, "espresso"))
+        self.assertEqual(boolean.minimize("a*~a", "espresso"), boolean.FALSE)
+        self.assertEqual(boolean.minimize("a+~a", "espresso"), boolean.TRUE)
+        self.assertEqual(
+            boolean.minimize("(a*b)+(~a*c)+(b*c)", "espresso"),
+            boolean.parse("(a*b)+(~a*c)"))
+
+    def test_espresso_wide(self):
+        terms = []
+        for i in range(8):
+            terms.append("a%s*b%s*c" % (i, i))
+            terms.append("a%s*~b%s*c" % (i, i))
+            terms.append("a%s*b%s*~c" % (i, i))
+        expr = boolean.parse("+".join(terms), eval=False)
+        result = boolean.minimize(expr, "espresso")
+        self.assertEqual(len(result.args), 16)
+        for i in range(8):
+            self.assertTrue(boolean.parse("a%s*b%s" % (i, i)) in result.args)
+            self.assertTrue(boolean.parse("a%s*c" % i) in result.args)
+        self.assertEqual(boolean.minimize(expr, "espresso", iterations=0),
+                         result)
+
+
 class BooleanAlgebraTestCase(unittest.TestCase):
 
     def test_implementation(self):
@@ -461,6 +622,55 @@ class BooleanAlgebraTestCase(unittest.TestCase):
         self.assertEqual((a * b).eval(), boolean.FALSE)
 
 
+class CompileTestCase(unittest.TestCase):
+
+    def test_compile(self):
+        a, b, c = boolean.symbols("a", "b", "c")
+        expr = boolean.parse("(a*~b)+~(a+c)", eval=False)
+        f = expr.compile()
+        for values in itertools.product((False, True), repeat=3):
+            subs_dict = dict(zip((a, b, c), values))
+            self.assertEqual(f(values), bool(expr.subs(subs_dict)))
+        self.assertTrue(expr.compile() is f)
+        self.assertTrue(boolean.TRUE.compile()(()) is True)
+        self.assertTrue(boolean.FALSE.compile()(()) is False)
+        self.assertTrue(a.compile()((boolean.TRUE,)) is True)
+
+    def test_order(self):
+        a, b = boolean.symbols("a", "b")
+        expr = a * ~b
+        self.assertTrue(expr.compile((a, b))((True, False)))
+        self.assertFalse(expr.compile((b, a))((True, False)))
+        self.assertRaises(ValueError, expr.compile, (a,))
+
+    def test_bitmask(self):
+        expr = boolean.parse("a*~b+c")
+        f = expr.compile(bitmask=True)
+        g = expr.compile()
+        for i, values in enumerate(itertools.product((0, 1), repeat=3)):
+            self.assertEqual(f(i), g(values))
+
+    def test_short_circuit(self):
+        class Fail:
+
+            def __bool__(self):
+                raise AssertionError("Evaluated the second argument.")
+
+        a, b = boolean.symbols("a", "b")
+        self.assertFalse((a * b).compile((a, b))((False, Fail())))
+        self.assertTrue((a + b).compile((a, b))((True, Fail())))
+
+    def test_deep(self):
+        expr = boolean.Symbol("x0")
+        for i in range(1, 300):
+            expr = boolean.OR(boolean.AND(expr, boolean.Symbol("x%s" % i),
+                                          eval=False),
+                              boolean.Symbol("y"), eval=False)
+        f = expr.compile(bitmask=True)
+        self.assertFalse(f(0))
+        self.assertTrue(f(1))
+
+
 class TruthTableTestCase(unittest.TestCase):
 
     def test_incorrect_data(self):
@@ -499,6 +709,54 @@ class TruthTableTestCase(unittest.TestCase):
                 self.assertTrue(s in table[0].keys())
             self.assertTrue(s in table[0].keys())
 
+    def test_columns(self):
+        a, b, c = boolean.symbols("a", "b", "c")
+        expr = boolean.parse("(a*~b)+~(a+c)+1*c", eval=False)
+        symbols, columns = boolean.truth_table_columns(expr)
+        self.assertEqual(symbols, (a, b, c))
+        self.assertEqual(columns[a], 0b11110000)
+        self.assertEqual(columns[b], 0b11001100)
+        self.assertEqual(columns[c], 0b10101010)
+        self.assertEqual(columns[boolean.TRUE], 0b11111111)
+        f = expr.compile(symbols, bitmask=True)
+        for i in range(8):
+            self.assertEqual(bool(columns[expr] >> i & 1), f(i))
+
+        symbols, columns = boolean.truth_table_columns(a * b, (b, c, a))
+        self.assertEqual(symbols, (b, c, a))
+        self.assertEqual(columns[a * b], 0b10100000)
+        self.assertRaises(ValueError, boolean.truth_table_columns, a * b, (a,))
+
+    def test_rows(self):
+        expr = boolean.parse("(a*~b)+~(a+c)", eval=False)
+        table = boolean.truth_table(expr)
+        symbols = sorted(expr.symbols, key=str)
+        self.assertEqual(list(table[0].keys())[0], expr)
+        for row, values in zip(table,
+                               itertools.product((boolean.FALSE, boolean.TRUE),
+                                                 repeat=3)):
+            for s, v in zip(symbols, values):
+                self.assertTrue(row[s] is v)
+            subs_dict = dict(zip(symbols, values))
+            self.assertTrue(row[expr] is expr.subs(subs_dict))
+
+    def test_iter(self):
+        for expr in ("a", "(a*~b)+~(a+c)", "a*1+b", boolean.TRUE):
+            for format_str in (False, True):
+                table = boolean.truth_table(expr, format_str)
+                self.assertEqual(
+                    list(boolean.iter_truth_table(expr, format_str)), table)
+                self.assertEqual(
+                    list(boolean.iter_truth_table(expr, format_str, 1, 3)),
+                    table[1:3])
+        rows = boolean.iter_truth_table("+".join("x%s" % i for i in range(40)),
+                                        start=2 ** 40 - 1)
+        row = next(rows)
+        self.assertTrue(all(v is boolean.TRUE for v in row.values()))
+        self.assertRaises(StopIteration, next, rows)
+        self.assertRaises(ValueError, boolean.iter_truth_table, "a", False, -1)
+        self.assertRaises(TypeError, boolean.iter_truth_table, None)
+
     def test_format_str(self):
         expr = boolean.Symbol("A")
         table = boolean.truth_table(expr, True)
@@ -509,6 +767,48 @@ class TruthTableTestCase(unittest.TestCase):
                 self.assertTrue(v in (str(boolean.TRUE), str(boolean.FALSE)))
 
 
+class InterningTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = boolean.set_interning(True)
+
+    def tearDown(self):
+        boolean.set_interning(self.previous)
+
+    def test_identity(self):
+        parse = lambda x: boolean.parse(x, eval=False)
+        self.assertTrue(boolean.Symbol("a") is boolean.Symbol("a"))
+        self.assertTrue(boolean.Symbol() is not boolean.Symbol())
+        self.assertTrue(parse("a*b") is parse("b*a"))
+        self.assertTrue(parse("~(a+b)*c") is parse("c*~(b+a)"))
+        self.assertTrue(parse("a*b") is not parse("a+b"))
+        self.assertTrue(boolean.parse("(a*b)+(a*~b)") is boolean.Symbol("a"))
+
+    def test_equality(self):
+        a, b = boolean.symbols("a", "b")
+        self.assertTrue(a * b == b * a)
+        self.assertFalse(a * b == a + b)
+        self.assertEqual(hash(a * b), hash(b * a))
+        boolean.set_interning(False)
+        self.assertTrue(boolean.AND(a, b) == boolean.AND(b, a))
+        self.assertTrue(boolean.Symbol("a") == a)
+        self.assertTrue(boolean.Symbol("a") is not a)
+
+    def test_unhashable(self):
+        self.assertTrue(boolean.Symbol([1]) is not boolean.Symbol([1]))
+        self.assertEqual(boolean.Symbol([1]), boolean.Symbol([1]))
+
+    def test_collect(self):
+        import gc
+        import weakref
+        expr = boolean.parse("x1*x2+x3", eval=False)
+        ref = weakref.ref(expr)
+        self.assertTrue(expr in boolean._unique_table.values())
+        del expr
+        gc.collect()
+        self.assertTrue(ref() is None)
+
+
 class ParseTestCase(unittest.TestCase):
 
     def test_and(self):
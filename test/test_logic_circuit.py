@@ -1,9 +1,16 @@
 import sys
 sys.path.append("..")
 
+import itertools
+import pickle
 import unittest
 import logic_circuit as lc
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class ComponentTestCase(unittest.TestCase):
 
@@ -49,6 +56,23 @@ class GateTestCase(unittest.TestCase):
         g.remove(b)
         self.assertEqual(g.empty_input_keys, (g.expression,))
 
+    def test_lookup(self):
+        for n in (3, lc.LOOKUP_INPUTS + 1):
+            switches = [lc.Switch() for _ in range(n)]
+            names = ["X%d" % i for i in range(n)]
+            g = lc.Gate("X0*~X1+" + "*".join(names[1:]),
+                        dict(zip(names, switches)))
+            self.assertEqual(g._table is None, n > lc.LOOKUP_INPUTS)
+            for values in itertools.product((False, True), repeat=n):
+                for s, v in zip(switches, values):
+                    s.output = v
+                g.update()
+                self.assertEqual(g.output, values[0] and not values[1] or
+                                 all(values[1:]))
+            g.inputs[next(iter(g.inputs))] = None
+            g.update()
+            self.assertEqual(g.output, None)
+
     def test_anonymous(self):
         s = lc.Switch()
 
@@ -145,6 +169,538 @@ class CircuitBoardTestCase(unittest.TestCase):
         self.assertEqual(w.output, True)
         self.assertEqual(w.output, True)
 
+    def chain(self, length):
+        s = lc.Switch()
+        gates = [lc.Not(s)]
+        for _ in range(length - 1):
+            gates.append(lc.Not(gates[-1]))
+        return s, gates
+
+    def test_propagate(self):
+        s, gates = self.chain(100)
+        cb = lc.CircuitBoard([s] + gates)
+        self.assertTrue(cb.propagate())
+        self.assertEqual(gates[-1].output, False)
+        self.assertEqual(gates[-2].output, True)
+
+        self.assertTrue(cb.press(s))
+        self.assertEqual(gates[-1].output, True)
+        s.output = False
+        self.assertTrue(cb.propagate())
+        self.assertEqual(gates[-1].output, False)
+
+    def test_propagate_activity(self):
+        s1, gates1 = self.chain(50)
+        s2, gates2 = self.chain(50)
+        cb = lc.CircuitBoard(gates2 + [s2, s1] + gates1)
+        cb.propagate()
+        # Only the first chain changes
+        s1.press()
+        self.assertFalse(cb.propagate(max_events=49))
+        self.assertTrue(cb.propagate(max_events=1))
+        self.assertEqual(gates1[-1].output, True)
+        self.assertEqual(gates2[-1].output, False)
+
+    def test_propagate_changes(self):
+        s, gates = self.chain(2)
+        cb = lc.CircuitBoard([s] + gates)
+        cb.propagate()
+        self.assertEqual(gates[-1].output, False)
+        # Rewiring or adding a component updates everything again
+        gates[1].inputs[gates[1].empty_input_keys or
+                        tuple(gates[1].inputs)[0]] = s
+        cb.propagate()
+        self.assertEqual(gates[-1].output, True)
+        w = lc.Wire(gates[-1])
+        cb.append(w)
+        cb.propagate()
+        self.assertEqual(w.output, True)
+
+    def test_propagate_loop(self):
+        n = lc.Not()
+        n.inputs[n.empty_input_keys[0]] = n
+        cb = lc.CircuitBoard([n])
+        # A NOT gate feeding itself never gets a value
+        self.assertTrue(cb.propagate())
+        self.assertEqual(n.output, None)
+
+        # But once it has one it oscillates
+        s = lc.Switch(True)
+        n.inputs[tuple(n.inputs)[0]] = s
+        cb.append(s)
+        self.assertTrue(cb.propagate())
+        n.inputs[tuple(n.inputs)[0]] = n
+        self.assertFalse(cb.propagate(max_events=100))
+        self.assertFalse(cb.propagate(max_events=100))
+
+    def test_levels(self):
+        s, gates = self.chain(3)
+        a = lc.And((s, gates[-1]))
+        cb = lc.CircuitBoard([a] + gates + [s])
+        self.assertEqual(cb.levels(),
+                         [[gates[0], s], [gates[1]], [gates[2]], [a]])
+        # Only connections in the board make it work the levels out again
+        levels = cb.levels()
+        lc.Not(s)
+        self.assertTrue(cb.levels() is levels)
+        key = [k for k, v in a.inputs.items() if v is gates[-1]][0]
+        a.inputs[key] = gates[0]
+        self.assertEqual(cb.levels(), [[gates[0], s], [gates[1], a],
+                                       [gates[2]]])
+        n = lc.Not()
+        n.inputs[n.empty_input_keys[0]] = n
+        cb.append(n)
+        self.assertRaises(lc.RecursionError, cb.levels)
+        self.assertRaises(lc.RecursionError, cb.evaluate)
+
+    def test_loops(self):
+        s, gates = self.chain(3)
+        # An SR latch
+        q = lc.Nor((s, None))
+        nq = lc.Nor((gates[-1], q))
+        q.inputs[q.empty_input_keys[0]] = nq
+        n = lc.Not()
+        n.inputs[n.empty_input_keys[0]] = n
+        # A loop through a flip-flop isn't a feedback loop
+        f = lc.DFlipFlop(clock=lc.Clock())
+        f.inputs["D"] = lc.Not(f)
+        cb = lc.CircuitBoard([q, s, n, nq, f, f.inputs["D"]] + gates)
+        loops = cb.loops()
+        self.assertEqual(sorted(len(loop) for loop in loops), [1, 2])
+        self.assertEqual(set(max(loops, key=len)), {q, nq})
+        with self.assertRaises(lc.RecursionError) as context:
+            cb.levels()
+        self.assertEqual(set(context.exception.components), {q, nq, n})
+
+        # Far deeper than the recursion limit
+        s, gates = self.chain(sys.getrecursionlimit() * 2)
+        cb = lc.CircuitBoard(gates)
+        self.assertEqual(cb.loops(), [])
+        gates[0].inputs[tuple(gates[0].inputs)[0]] = gates[-1]
+        self.assertEqual(len(cb.loops()), 1)
+        self.assertEqual(set(cb.loops()[0]), set(gates))
+
+    def test_evaluate(self):
+        s, gates = self.chain(300)
+        cb = lc.CircuitBoard(list(reversed(gates)) + [s])
+        cb.evaluate()
+        self.assertEqual(gates[-1].output, False)
+        s.press()
+        cb.evaluate()
+        self.assertEqual(gates[-1].output, True)
+        self.assertTrue(cb.compile() is cb.compile())
+
+        # Changing the board compiles it again
+        w = lc.Wire(gates[-1])
+        cb.append(w)
+        cb.evaluate()
+        self.assertEqual(w.output, True)
+        w.input = s
+        cb.evaluate()
+        self.assertEqual(w.output, True)
+        s.press()
+        cb.evaluate()
+        self.assertEqual(w.output, False)
+
+    def test_evaluate_none(self):
+        s = lc.Switch()
+        unconnected = lc.And((s, None))
+        outside = lc.Not(s)
+        w1 = lc.Wire(unconnected)
+        w2 = lc.Wire(outside)
+        cb = lc.CircuitBoard([s, unconnected, w1, w2])
+        cb.evaluate()
+        self.assertEqual(w1.output, None)
+        # The NOT gate isn't in the board so hasn't been updated
+        self.assertEqual(w2.output, None)
+        outside.update()
+        cb.evaluate()
+        self.assertEqual(w2.output, True)
+
+    def test_evaluate_update(self):
+        expr = lc.boolean.parse("(A+~B)*(C+A*~D)+~(B*C)")
+        cb = lc.circuit_board(expr)
+        switches = [c for c in cb if isinstance(c, lc.Switch)]
+        for values in itertools.product((False, True),
+                                        repeat=len(switches)):
+            for switch, value in zip(switches, values):
+                switch.output = value
+            cb.evaluate()
+            compiled = [c.output for c in cb]
+            for _ in range(len(cb)):
+                cb.update()
+            self.assertEqual(compiled, [c.output for c in cb])
+
+    def test_simulate(self):
+        expr = lc.boolean.parse("(A+~B)*(C+A*~D)+~(B*C)")
+        cb = lc.circuit_board(expr)
+        switches = [c for c in cb if isinstance(c, lc.Switch)]
+        # Every combination of the switches, with the first as the top bit
+        n = len(switches)
+        count = 1 << n
+        words = {}
+        for i, switch in enumerate(switches):
+            bit = n - 1 - i
+            words[switch] = sum(1 << row for row in range(count)
+                                if row >> bit & 1)
+        outputs = cb.simulate(words, count)
+        for row in range(count):
+            for i, switch in enumerate(switches):
+                switch.output = row >> (n - 1 - i) & 1
+            cb.evaluate()
+            for c in cb:
+                if outputs[c] is None:
+                    self.assertEqual(c.output, None)
+                else:
+                    self.assertEqual(bool(outputs[c] >> row & 1), c.output)
+
+    def test_simulate_defaults(self):
+        s1, s2 = lc.Switch(), lc.Switch(True)
+        a = lc.And((s1, s2))
+        unconnected = lc.Or((s1, None))
+        cb = lc.CircuitBoard([s1, s2, a, unconnected])
+        outputs = cb.simulate({s1: 0b0110}, 4)
+        self.assertEqual(outputs[a], 0b0110)
+        self.assertEqual(outputs[s2], 0b1111)
+        self.assertEqual(outputs[unconnected], None)
+        # Nothing is changed
+        self.assertEqual(a.output, None)
+        outputs = cb.simulate({s1: 0b0110}, 70)
+        self.assertEqual(outputs[a], 0b0110)
+
+    def test_settle(self):
+        s, gates = self.chain(200)
+        cb = lc.CircuitBoard(list(reversed(gates)) + [s])
+        self.assertTrue(cb.settle())
+        self.assertEqual(gates[-1].output, False)
+
+        # A latch holding its state settles too
+        reset = lc.Switch()
+        q = lc.Nor((reset, None))
+        nq = lc.Nor((reset, q))
+        q.inputs[q.empty_input_keys[0]] = nq
+        q._output, nq._output = True, False
+        cb = lc.CircuitBoard([reset, q, nq])
+        self.assertTrue(cb.settle())
+        self.assertEqual((q.output, nq.output), (True, False))
+        self.assertFalse(cb.settle(max_steps=0))
+
+    def test_settle_oscillation(self):
+        s = lc.Switch()
+        w = lc.Wire(s)
+        ring = [lc.Not()]
+        ring.append(lc.Not(ring[-1]))
+        ring.append(lc.Not(ring[-1]))
+        ring[0].inputs[ring[0].empty_input_keys[0]] = ring[-1]
+        for g, output in zip(ring, (True, False, True)):
+            g._output = output
+        cb = lc.CircuitBoard([s, w] + ring)
+        with self.assertRaises(lc.OscillationError) as context:
+            cb.settle()
+        self.assertEqual(set(context.exception.components), set(ring))
+        self.assertEqual(context.exception.period, 2)
+        self.assertEqual(w.output, False)
+
+    def test_fanout(self):
+        s1, s2 = lc.Switch(), lc.Switch()
+        a = lc.And((s1, s1))
+        o = lc.Or((a, s2))
+        outside = lc.Not(s1)
+        cb = lc.CircuitBoard([s1, s2, a, o])
+        self.assertEqual(cb.readers(s1), (a,))
+        self.assertEqual(set(cb.drivers(o)), {a, s2})
+        self.assertEqual(cb.drivers(outside), (s1,))
+
+        # Connections are followed as they change
+        o.inputs[[k for k, v in o.inputs.items() if v is s2][0]] = s1
+        self.assertEqual(set(cb.readers(s1)), {a, o})
+        self.assertEqual(cb.readers(s2), ())
+        a.inputs = {k: None for k in a.inputs}
+        self.assertEqual(cb.readers(s1), (o,))
+        cb.append(outside)
+        self.assertEqual(set(cb.readers(s1)), {o, outside})
+        cb.pop()
+        self.assertEqual(cb.readers(s1), (o,))
+
+        # Including a component in the board twice
+        cb.append(o)
+        cb.remove(o)
+        self.assertTrue(o in cb)
+        self.assertEqual(cb.readers(s1), ())
+        self.assertEqual(o.empty_input_keys, tuple(o.inputs))
+
+    def test_pickle(self):
+        s = lc.Switch()
+        w = lc.Wire(s)
+        cb = lc.CircuitBoard([s, w, lc.Bulb(w)])
+        cb.evaluate()
+        cb = pickle.loads(pickle.dumps(cb))
+        s, w, b = cb
+        self.assertEqual(cb.readers(s), (w,))
+        s.press()
+        cb.evaluate()
+        self.assertEqual(b.output, True)
+
+    def test_remove_all(self):
+        s, gates = self.chain(10)
+        cb = lc.CircuitBoard([s] + gates)
+        cb.remove_all(gates[::2])
+        self.assertEqual(list(cb), [s] + gates[1::2])
+        for g in gates[1::2]:
+            self.assertEqual(cb.drivers(g), ())
+        self.assertEqual(cb.readers(s), ())
+
+
+class SequentialTestCase(unittest.TestCase):
+
+    def counter(self, n):
+        clock = lc.Clock()
+        flops = [lc.DFlipFlop(clock=clock) for _ in range(n)]
+        components = [clock] + flops
+        carry = None
+        for f in flops:
+            if carry is None:
+                d = lc.Not(f)
+                carry = f
+            else:
+                d = lc.Or((lc.And((f, lc.Not(carry))),
+                           lc.And((lc.Not(f), carry))))
+                components += [v for v in d.inputs.values()]
+                components += [g for v in d.inputs.values()
+                               for g in v.inputs.values()
+                               if isinstance(g, lc.Not)]
+                carry = lc.And((f, carry))
+                components.append(carry)
+            f.inputs["D"] = d
+            components.append(d)
+        return clock, flops, lc.CircuitBoard(components)
+
+    def value(self, flops):
+        return sum(f.output << i for i, f in enumerate(flops))
+
+    def test_flip_flop(self):
+        d, clock = lc.Switch(True), lc.Clock()
+        f = lc.DFlipFlop(d, clock)
+        self.assertEqual(f.output, False)
+        f.update()
+        self.assertEqual(f.output, False)
+        clock.tick()
+        f.update()
+        self.assertEqual(f.output, True)
+        d.press()
+        f.update()
+        self.assertEqual(f.output, True)
+        clock.tick()
+        f.update()
+        clock.tick()
+        f.update()
+        self.assertEqual(f.output, False)
+
+        f.inputs["D"] = None
+        clock.tick()
+        f.update()
+        clock.tick()
+        f.update()
+        self.assertEqual(f.output, None)
+
+    def test_latch(self):
+        d, enable = lc.Switch(True), lc.Switch()
+        latch = lc.DLatch(d, enable)
+        latch.update()
+        self.assertEqual(latch.output, False)
+        enable.press()
+        latch.update()
+        self.assertEqual(latch.output, True)
+        d.press()
+        latch.update()
+        self.assertEqual(latch.output, False)
+        enable.press()
+        d.press()
+        latch.update()
+        self.assertEqual(latch.output, False)
+        latch.inputs["EN"] = None
+        latch.update()
+        self.assertEqual(latch.output, None)
+
+    def test_counter(self):
+        clock, flops, cb = self.counter(6)
+        cb.propagate()
+        for _ in range(45):
+            clock.tick()
+            cb.propagate()
+            clock.tick()
+            cb.propagate()
+        self.assertEqual(self.value(flops), 45)
+
+        clock, flops, cb = self.counter(6)
+        cb.cycle(45)
+        self.assertEqual(self.value(flops), 45)
+        cb.cycle()
+        self.assertEqual(self.value(flops), 46)
+        # The gates are updated too
+        self.assertEqual(flops[0].inputs["D"].output, True)
+
+    def test_cycle(self):
+        # A shift register and latches
+        clock, enable = lc.Clock(), lc.Switch()
+        flops = [lc.DFlipFlop(lc.Switch(True), lc.Wire(clock))]
+        for _ in range(3):
+            flops.append(lc.DFlipFlop(flops[-1], clock))
+        follow = lc.DLatch(flops[-1], clock)
+        held = lc.DLatch(flops[-1], enable)
+        cb = lc.CircuitBoard([clock, enable, flops[0].inputs["CLK"],
+                              follow, held] + flops)
+        cb.cycle(2)
+        self.assertEqual([f.output for f in flops],
+                         [True, True, False, False])
+        cb.cycle(2)
+        # Latches store what the last flip-flop had before the clock rose
+        self.assertEqual(follow.output, False)
+        enable.press()
+        cb.cycle()
+        self.assertEqual(follow.output, True)
+        self.assertEqual(held.output, True)
+        enable.press()
+        flops[-1]._output = False
+        cb.cycle()
+        self.assertEqual(follow.output, False)
+        self.assertEqual(held.output, True)
+
+        flops[0].inputs["CLK"] = lc.Switch()
+        self.assertRaises(ValueError, cb.cycle)
+
+
+class EventSimulatorTestCase(unittest.TestCase):
+
+    def test_wheel(self):
+        wheel = lc.TimingWheel(4)
+        for time, event in ((100, "a"), (3, "b"), (7, "c"), (3, "d"),
+                            (1000, "e"), (5, "f")):
+            wheel.schedule(time, event)
+        self.assertEqual(len(wheel), 6)
+        self.assertEqual(wheel.peek(), 3)
+        self.assertEqual([wheel.pop() for _ in range(len(wheel))],
+                         [(3, "b"), (3, "d"), (5, "f"), (7, "c"),
+                          (100, "a"), (1000, "e")])
+        self.assertTrue(wheel.peek() is None)
+        self.assertRaises(IndexError, wheel.pop)
+        self.assertRaises(ValueError, wheel.schedule, 999, "g")
+        wheel.schedule(1010, "g")
+        wheel.advance(1005)
+        self.assertEqual(wheel.now, 1005)
+        self.assertRaises(ValueError, wheel.advance, 1020)
+        self.assertEqual(wheel.pop(), (1010, "g"))
+
+    def glitch(self, delays):
+        # s AND NOT s is briefly True after s rises
+        s = lc.Switch()
+        n = lc.Not(s)
+        a = lc.And((s, n))
+        cb = lc.CircuitBoard([s, n, a])
+        changes = []
+        sim = lc.EventSimulator(cb, delays, lambda time, c, output:
+                                changes.append((time, c, output)))
+        self.assertTrue(sim.run())
+        sim.set(s, True, 10)
+        self.assertTrue(sim.run())
+        return [(time, output) for time, c, output in changes if c is a]
+
+    def test_delays(self):
+        self.assertEqual(self.glitch({lc.Not: 2, lc.And: 1}),
+                         [(3, False), (11, True), (13, False)])
+        self.assertEqual(self.glitch({lc.Not: 2,
+                                      lc.And: (1, lc.TRANSPORT)}),
+                         [(3, False), (11, True), (13, False)])
+        # An inertial delay longer than the pulse swallows it
+        self.assertEqual(self.glitch({lc.Not: 2, lc.And: 3}), [(5, False)])
+        # But a transport delay doesn't
+        self.assertEqual(self.glitch({lc.Not: 2,
+                                      lc.And: (3, lc.TRANSPORT)}),
+                         [(5, False), (13, True), (15, False)])
+        # Modes are compared by value, not identity
+        self.assertEqual(self.glitch({lc.Not: 2,
+                                      lc.And: (3, "".join("transport"))}),
+                         [(5, False), (13, True), (15, False)])
+
+    def test_chain(self):
+        s = lc.Switch()
+        gates = [lc.Not(s)]
+        for _ in range(99):
+            gates.append(lc.Wire(gates[-1]))
+            gates.append(lc.Not(gates[-1]))
+        cb = lc.CircuitBoard([s] + gates)
+        sim = lc.EventSimulator(cb, {lc.Gate: 2, lc.Wire: 1})
+        self.assertTrue(sim.run())
+        self.assertEqual(sim.time, 100 * 2 + 99)
+        sim.set(s, True)
+        self.assertFalse(sim.run(until=sim.time + 100))
+        self.assertEqual(sim.time, 399)
+        self.assertTrue(sim.run())
+        self.assertEqual(sim.time, 598)
+        self.assertEqual(gates[-1].output, True)
+
+    def test_oscillator(self):
+        enable = lc.Switch(True)
+        n1 = lc.Nand((enable, None))
+        n2 = lc.Not(n1)
+        n3 = lc.Not(n2)
+        n1.inputs[n1.empty_input_keys[0]] = n3
+        n1._output, n2._output, n3._output = True, False, False
+        changes = []
+        sim = lc.EventSimulator(lc.CircuitBoard([enable, n1, n2, n3]),
+                                monitor=lambda time, c, output:
+                                changes.append(time) if c is n3 else None)
+        self.assertFalse(sim.run(until=30))
+        self.assertEqual(changes, list(range(1, 31, 3)))
+        self.assertFalse(sim.run(max_events=5))
+        self.assertRaises(TypeError, sim.set, n1, True)
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class SimulateBatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.switches = [lc.Switch() for _ in range(4)]
+        s = self.switches
+        n = lc.Not(s[1])
+        a = lc.And((s[0], n))
+        o = lc.Or((a, s[2]))
+        nand = lc.Nand((o, s[3]))
+        w = lc.Wire(nand)
+        self.bulbs = [lc.Bulb(w), lc.Bulb(a)]
+        self.board = lc.CircuitBoard([self.bulbs[0], nand, w, o] + s +
+                                     [a, self.bulbs[1], n])
+
+    def test_exhaustive(self):
+        vectors = numpy.array(list(itertools.product((False, True),
+                                                     repeat=4)))
+        outputs = lc.simulate_batch(self.board, vectors)
+        self.assertEqual(outputs.shape, (16, 2))
+        self.assertEqual(outputs.dtype, bool)
+        for vector, output in zip(vectors, outputs):
+            for switch, value in zip(self.switches, vector):
+                switch.output = value
+            self.board.evaluate()
+            self.assertEqual(list(output), [b.output for b in self.bulbs])
+
+    def test_chunks(self):
+        random = numpy.random.RandomState(0)
+        vectors = random.rand(1000, 4) < 0.5
+        expected = ~(((vectors[:, 0] & ~vectors[:, 1]) | vectors[:, 2]) &
+                     vectors[:, 3])
+        for chunk_size in (64, 100, 1 << 16):
+            outputs = lc.simulate_batch(self.board, vectors, chunk_size)
+            self.assertTrue((outputs[:, 0] == expected).all())
+            self.assertTrue((outputs[:, 1] ==
+                             (vectors[:, 0] & ~vectors[:, 1])).all())
+
+    def test_errors(self):
+        self.assertRaises(ValueError, lc.simulate_batch, self.board,
+                          numpy.zeros((3, 2), dtype=bool))
+        self.board.append(lc.And((self.switches[0], None)))
+        self.assertRaises(ValueError, lc.simulate_batch, self.board,
+                          numpy.zeros((3, 4), dtype=bool))
+
 
 class ConvertTestCase(unittest.TestCase):
 
@@ -152,6 +708,8 @@ class ConvertTestCase(unittest.TestCase):
         self.assertIsInstance(lc.expression(lc.And()), lc.boolean.AND)
         self.assertIsInstance(lc.expression(lc.Bulb()), lc.boolean.Symbol)
         self.assertIsInstance(lc.expression(lc.Switch()), lc.boolean.Symbol)
+        self.assertEqual(lc.expression(None), lc.boolean.Symbol("A"))
+        self.assertEqual(lc.expression(lc.Bulb()), lc.boolean.Symbol("A"))
         i = lc.Input()
         self.assertIsInstance(lc.expression(lc.And((i, i))).eval(),
                               lc.boolean.Symbol)
@@ -167,6 +725,44 @@ class ConvertTestCase(unittest.TestCase):
                 if s is None)
         )
 
+    def test_expression_fanout(self):
+        a, b = lc.Switch(), lc.Switch()
+        x = lc.And((a, b))
+        y = lc.Or((x, lc.Wire(a)))
+        z = lc.Nand((lc.Wire(x), y))
+        expr = lc.expression(z)
+        self.assertEqual(expr.symbols, set(lc.boolean.symbols("A", "B")))
+        self.assertEqual(lc.boolean.truth_table_columns(expr)[1][expr],
+                         0b0111)
+
+        expr, definitions = lc.expression(lc.Bulb(lc.Wire(z)), shared=True)
+        self.assertEqual(len(definitions), 1)
+        symbol, shared = definitions.popitem()
+        self.assertEqual(shared.eval(), lc.boolean.parse("A*B"))
+        self.assertEqual(symbol, lc.boolean.Symbol("C"))
+        self.assertEqual(len(expr.symbols), 2)
+        self.assertTrue(symbol in expr.symbols)
+        expr, definitions = lc.expression(x, shared=True)
+        self.assertEqual((expr.eval(), definitions),
+                         (lc.boolean.parse("A*B"), {}))
+
+        # Far deeper than the recursion limit
+        g = a
+        depth = sys.getrecursionlimit() * 2
+        for _ in range(depth):
+            g = lc.Not(g)
+        expr = lc.expression(g)
+        for _ in range(depth):
+            expr = expr.args[0]
+        self.assertEqual(expr, lc.boolean.Symbol("A"))
+
+        w = lc.Wire()
+        n = lc.Not(w)
+        w.input = lc.And((n, a))
+        with self.assertRaises(lc.RecursionError) as context:
+            lc.expression(lc.Or((n, a)))
+        self.assertEqual(len(context.exception.components), 3)
+
     def test_circuit_board(self):
         self.assertIsInstance(lc.circuit_board("A"), lc.CircuitBoard)
 
@@ -179,6 +775,38 @@ class ConvertTestCase(unittest.TestCase):
             self.assertEqual(expr,
                              lc.expression(lc.circuit_board(expr)[-1]).eval())
 
+    def test_circuit_board_sharing(self):
+        expr = lc.boolean.parse("(A*B)+(A*B*C)+~(A*B)", eval=False)
+        cb = lc.circuit_board(expr)
+        gates = [c for c in cb if type(c) is lc.Gate]
+        switches = [c for c in cb if isinstance(c, lc.Switch)]
+        # A*B, (A*B)*C, ~(A*B) and the OR
+        self.assertEqual(len(gates), 4)
+        self.assertEqual(len(switches), 3)
+        self.assertEqual(len(cb.readers(gates[0])), 1)
+        self.assertEqual(len(cb.readers(cb.readers(gates[0])[0])), 3)
+        for a, b, c in itertools.product((False, True), repeat=3):
+            for switch, value in zip(switches, (a, b, c)):
+                switch.output = value
+            cb.evaluate()
+            self.assertEqual(cb[-1].output,
+                             a and b or a and b and c or not (a and b))
+
+    def test_circuit_board_balanced(self):
+        symbols = lc.boolean.symbols(*("x%d" % i for i in range(40)))
+        cb = lc.circuit_board(lc.boolean.OR(*symbols))
+        for c in cb:
+            if type(c) is lc.Gate:
+                self.assertTrue(len(c.inputs) <= lc.LOOKUP_INPUTS)
+        # Gates and their wires, as a tree of depth 3 instead of a chain
+        self.assertEqual(len(cb.levels()), 8)
+        nodes, root = lc.synthesis_plan(lc.boolean.AND(*symbols), 2)
+        depth = [0] * len(nodes)
+        for i, (_, args) in enumerate(nodes):
+            depth[i] = max((depth[j] + 1 for j in args), default=0)
+        self.assertEqual(depth[root], 6)
+        self.assertRaises(ValueError, lc.synthesis_plan, symbols[0], 1)
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -0,0 +1,245 @@
+import sys
+sys.path.append("..")
+
+import io
+import itertools
+import random
+import unittest
+import boolean
+import logic_circuit as lc
+import sat
+
+
+def brute_force(n, clauses):
+    for bits in itertools.product((False, True), repeat=n):
+        if all(any((l > 0) == bits[abs(l) - 1] for l in c) for c in clauses):
+            return True
+    return False
+
+
+def carries(n):
+    """
+    Returns the carry outs of two differently built ripple carry adders.
+    """
+    a = [lc.Switch() for _ in range(n)]
+    b = [lc.Switch() for _ in range(n)]
+    c1 = c2 = lc.Switch()
+    for x, y in zip(a, b):
+        c1 = lc.Or((lc.And((x, y)), lc.And((c1, lc.Or((x, y))))))
+        c2 = lc.Or((lc.Or((lc.And((x, y)), lc.And((x, c2)))),
+                    lc.And((y, c2))))
+    return c1, c2
+
+
+class SolverTestCase(unittest.TestCase):
+
+    def test_luby(self):
+        self.assertEqual([sat._luby(i) for i in range(15)],
+                         [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8])
+
+    def test_clauses(self):
+        s = sat.Solver()
+        a, b = s.new_var(), s.new_var()
+        self.assertTrue(s.add_clause((a, b)))
+        self.assertTrue(s.add_clause((a, -a)))
+        self.assertTrue(s.add_clause((-a,)))
+        self.assertRaises(ValueError, s.add_clause, (3,))
+        self.assertTrue(s.solve())
+        self.assertFalse(s.value(a))
+        self.assertTrue(s.value(b))
+        self.assertTrue(s.value(-a))
+        self.assertFalse(s.solve((-b,)))
+        self.assertTrue(s.value(a) is None)
+        self.assertTrue(s.solve())
+        self.assertFalse(s.add_clause((-b,)))
+        self.assertFalse(s.solve())
+
+    def test_random(self):
+        random.seed(1)
+        for _ in range(200):
+            n = random.randint(3, 10)
+            clauses = [[random.choice((1, -1)) * random.randint(1, n)
+                        for _ in range(3)]
+                       for _ in range(random.randint(1, 5 * n))]
+            s = sat.Solver()
+            for _ in range(n):
+                s.new_var()
+            for clause in clauses:
+                s.add_clause(clause)
+            result = s.solve()
+            self.assertEqual(result, brute_force(n, clauses))
+            if result:
+                self.assertTrue(all(any(s.value(l) for l in c)
+                                    for c in clauses))
+
+    def test_pigeonhole(self):
+        # 6 pigeons don't fit in 5 holes
+        s = sat.Solver()
+        p = [[s.new_var() for _ in range(5)] for _ in range(6)]
+        for pigeon in p:
+            s.add_clause(pigeon)
+        for hole in range(5):
+            for i, j in itertools.combinations(range(6), 2):
+                s.add_clause((-p[i][hole], -p[j][hole]))
+        self.assertFalse(s.solve())
+
+
+class EncoderTestCase(unittest.TestCase):
+
+    def test_expression(self):
+        a, b, c = boolean.symbols("a", "b", "c")
+        model = sat.satisfiable((a + b) * ~a * (~b + c))
+        self.assertEqual(model, {a: boolean.FALSE,
+                                 b: boolean.TRUE,
+                                 c: boolean.TRUE})
+        self.assertTrue(sat.satisfiable("a*~a") is None)
+        self.assertEqual(sat.satisfiable("1"), {})
+        self.assertTrue(sat.satisfiable("0") is None)
+        self.assertRaises(TypeError, sat.satisfiable, 1)
+
+    def test_equivalent(self):
+        self.assertTrue(sat.equivalent("~(a*b)", "~a+~b"))
+        self.assertTrue(sat.equivalent("a*(b+c)", "a*b+a*c"))
+        self.assertFalse(sat.equivalent("a*b", "a+b"))
+        self.assertTrue(sat.equivalent("a+~a", "1"))
+
+    def test_random(self):
+        random.seed(5)
+        symbols = boolean.symbols(*"abcd")
+
+        def random_expression(depth):
+            if depth == 0 or random.random() < 0.2:
+                return random.choice(symbols)
+            op = random.choice((boolean.AND, boolean.OR))
+            expr = op(random_expression(depth - 1),
+                      random_expression(depth - 1), eval=False)
+            return ~expr if random.random() < 0.3 else expr
+
+        for _ in range(30):
+            expr = random_expression(4)
+            column = boolean.truth_table_columns(expr, symbols)[1][expr]
+            model = sat.satisfiable(expr)
+            self.assertEqual(model is None, column == 0)
+            if model is not None:
+                row = sum(1 << (len(symbols) - 1 - i)
+                          for i, symbol in enumerate(symbols)
+                          if model.get(symbol) is boolean.TRUE)
+                self.assertTrue(column >> row & 1)
+
+    def test_component(self):
+        i1, i2 = lc.Switch(), lc.Switch()
+        model = sat.satisfiable(lc.And((i1, lc.Not(i2))))
+        self.assertEqual(model, {i1: True, i2: False})
+        self.assertTrue(sat.satisfiable(lc.And((i1, lc.Not(i1)))) is None)
+        # An unconnected input can be anything
+        self.assertTrue(sat.satisfiable(lc.And((i1, None))) is not None)
+        self.assertTrue(sat.equivalent(lc.Nand((i1, i2)),
+                                       lc.Or((lc.Not(i1), lc.Not(i2)))))
+        self.assertFalse(sat.equivalent(lc.Nand((i1, i2)),
+                                        lc.Nor((i1, i2))))
+        # Wires and NOT gates don't need variables of their own
+        encoder = sat.Encoder()
+        literal = encoder.component(lc.Not(lc.Wire(lc.Wire(i1))))
+        self.assertEqual(literal, -encoder.variable(i1))
+        self.assertEqual(encoder.solver.nvars, 1)
+
+    def test_loop(self):
+        # An SR latch from two NOR gates
+        s, r = lc.Switch(), lc.Switch()
+        q = lc.Nor((r, None))
+        nq = lc.Nor((s, q))
+        q.inputs[[k for k, v in q.inputs.items() if v is None][0]] = nq
+        encoder = sat.Encoder()
+        q_literal = encoder.component(q)
+        nq_literal = encoder.component(nq)
+        solver = encoder.solver
+        # Holding with neither set nor reset, either state is stable
+        s_literal, r_literal = encoder.variable(s), encoder.variable(r)
+        self.assertTrue(solver.solve((-s_literal, -r_literal, q_literal)))
+        self.assertTrue(solver.solve((-s_literal, -r_literal, -q_literal)))
+        self.assertFalse(solver.solve((q_literal, nq_literal)))
+        self.assertFalse(solver.solve((r_literal, q_literal)))
+
+    def test_circuit_board(self):
+        board = lc.circuit_board("a*b+~c")
+        encoder = sat.Encoder()
+        literals = encoder.circuit_board(board)
+        self.assertEqual(set(literals), set(board))
+        self.assertTrue(encoder.solver.solve((literals[board[-1]],)))
+
+    def test_adders(self):
+        c1, c2 = carries(40)
+        self.assertTrue(sat.equivalent(c1, c2))
+        self.assertFalse(sat.equivalent(c1, lc.Not(c2)))
+
+
+class DimacsTestCase(unittest.TestCase):
+
+    def xor_chain(self, n):
+        expr = boolean.Symbol("x0")
+        for i in range(1, n):
+            x = boolean.Symbol("x%d" % i)
+            expr = boolean.OR(boolean.AND(expr, ~x, eval=False),
+                              boolean.AND(boolean.NOT(expr, eval=False), x,
+                                          eval=False), eval=False)
+        return expr
+
+    def test_plaisted_greenbaum(self):
+        expr = self.xor_chain(10)
+        full = sat.Encoder(sat.DimacsWriter())
+        full.add(expr)
+        half = sat.Encoder(sat.DimacsWriter(), plaisted_greenbaum=True)
+        half.add(expr)
+        self.assertTrue(half.solver.nclauses < full.solver.nclauses)
+        self.assertEqual(half.solver.nvars, full.solver.nvars)
+
+        # Clauses are added when a literal is later used the other way
+        a, b = boolean.symbols("a", "b")
+        encoder = sat.Encoder(plaisted_greenbaum=True)
+        encoder.add(~(a * b))
+        literal = encoder.expression(a * b)
+        self.assertFalse(encoder.solver.solve((literal,)))
+        self.assertTrue(encoder.solver.solve((-literal,)))
+
+    def test_write(self):
+        file = io.StringIO()
+        expr = self.xor_chain(50)
+        variables = sat.write_dimacs(file, expr)
+        lines = file.getvalue().splitlines()
+        header = [line for line in lines if line.startswith("p")]
+        self.assertEqual(len(header), 1)
+        _, _, nvars, nclauses = header[0].split()
+        clauses = [line for line in lines if line[0] not in "cp"]
+        self.assertEqual(len(clauses), int(nclauses))
+        # Distributing this into CNF would need 2^49 clauses
+        self.assertTrue(int(nclauses) < 10 * 50)
+        self.assertEqual(len(variables), 50)
+        self.assertIn("c %d x0" % variables[boolean.Symbol("x0")], lines)
+
+        solver = sat.read_dimacs(io.StringIO(file.getvalue()))
+        self.assertEqual(solver.nvars, int(nvars))
+        self.assertTrue(solver.solve())
+        parity = sum(solver.value(v) for v in variables.values())
+        self.assertEqual(parity % 2, 1)
+
+    def test_write_unsatisfiable(self):
+        file = io.StringIO()
+        sat.write_dimacs(file, "a*b", "~a+~b")
+        self.assertFalse(sat.read_dimacs(io.StringIO(file.getvalue())).solve())
+
+    def test_write_circuit_board(self):
+        switch = lc.Switch()
+        wire = lc.Wire(lc.And((switch, lc.Not(switch))))
+        board = lc.CircuitBoard([switch, wire, lc.Bulb(wire)])
+        file = io.StringIO()
+        sat.write_dimacs(file, board)
+        self.assertFalse(sat.read_dimacs(io.StringIO(file.getvalue())).solve())
+        board = lc.circuit_board("a*b")
+        file = io.StringIO()
+        variables = sat.write_dimacs(file, board)
+        self.assertEqual(len(variables), 2)
+        self.assertTrue(sat.read_dimacs(io.StringIO(file.getvalue())).solve())
+
+
+if __name__ == "__main__":
+    unittest.main()